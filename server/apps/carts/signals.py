@@ -1,7 +1,8 @@
 import logging
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from apps.products.services.tasks import update_popularity_score
+from apps.products.services.product_services import ProductServices
+from apps.products.services.tasks import schedule_popularity_update
 
 from apps.carts.models import OrderItem
 
@@ -24,10 +25,33 @@ def order_item_post_save(sender, instance, created, **kwargs):
     """
     logger.debug(f"Starting post_save for order_item={instance.id}, product={instance.product.id}")
     try:
+        # Денормализованный счетчик покупок учитывает только позиции, привязанные к заказу
+        if instance.order_id:
+            ProductServices.refresh_product_stats(instance.product_id)
         # Вызываем обновление популярности только если OrderItem привязан к заказу
         if instance.order and instance.order.status == 'processing':
-            update_popularity_score.delay(instance.product.id)
+            schedule_popularity_update([instance.product_id])
             logger.info(f"Scheduled popularity score update for product={instance.product.id}"
                         f" in order={instance.order.id}")
     except Exception as e:
         logger.error(f"Failed to process post_save for order_item={instance.id}: {str(e)}")
+
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_post_delete(sender, instance, **kwargs):
+    """
+    Обрабатывает событие удаления OrderItem и пересчитывает счетчик покупок продукта.
+
+    Args:
+        sender: Класс модели, отправивший сигнал (OrderItem).
+        instance: Экземпляр модели OrderItem.
+        kwargs: Дополнительные аргументы сигнала.
+
+    Returns:
+        None: Пересчитывает денормализованные данные продукта.
+    """
+    try:
+        if instance.order_id:
+            ProductServices.refresh_product_stats(instance.product_id)
+    except Exception as e:
+        logger.error(f"Failed to process post_delete for order_item={instance.id}: {str(e)}")
@@ -1,5 +1,6 @@
 import hashlib
-from django.core.cache import cache
+import time
+from django.core.cache import cache, caches
 import logging
 from typing import Any, Optional
 from rest_framework.request import Request
@@ -14,6 +15,8 @@ class CacheService:
     """
 
     CACHE_TIMEOUT = 300  # 5 минут по умолчанию
+    LOCAL_CACHE_TIMEOUT = 60  # Время жизни записей в памяти процесса
+    LOCAL_VERSION_TIMEOUT = 5  # Время жизни копии версии группы в памяти процесса
     PRODUCT_RELATED_PREFIXES = [
         'reviews',
         'product_detail',
@@ -100,18 +103,208 @@ class CacheService:
         except Exception as e:
             logger.error(f"Failed to invalidate cache for key {prefix}: {str(e)}")
 
+    @staticmethod
+    def invalidate_keys(keys: list) -> None:
+        """Удаляет набор ключей кэша одной командой.
+
+        Args:
+            keys (list): Список ключей кэша.
+
+        Returns:
+            None: Метод не возвращает значения, только инвалидирует кэш.
+        """
+        if not keys:
+            return
+        try:
+            cache.delete_many(keys)
+            logger.debug(f"Invalidated cache for {len(keys)} keys")
+        except Exception as e:
+            logger.error(f"Failed to invalidate cache keys: {str(e)}")
+
+    @staticmethod
+    def increment_counter(key: str, timeout: Optional[int] = None) -> int:
+        """Атомарно увеличивает счетчик в кэше, создавая его при отсутствии.
+
+        Время жизни задается при создании счетчика и не продлевается при увеличении.
+
+        Args:
+            key (str): Ключ счетчика.
+            timeout (int, optional): Время жизни счетчика в секундах.
+
+        Returns:
+            int: Новое значение счетчика или 0 при ошибке кэша.
+        """
+        try:
+            cache.add(key, 0, timeout or CacheService.CACHE_TIMEOUT)
+            return cache.incr(key)
+        except Exception as e:
+            logger.error(f"Failed to increment counter {key}: {str(e)}")
+            return 0
+
+    @staticmethod
+    def add_if_absent(key: str, timeout: Optional[int] = None) -> bool:
+        """Атомарно создает маркер в кэше, если его еще нет.
+
+        Args:
+            key (str): Ключ маркера.
+            timeout (int, optional): Время жизни маркера в секундах.
+
+        Returns:
+            bool: True, если маркер создан этим вызовом или кэш недоступен, иначе False.
+        """
+        try:
+            return cache.add(key, 1, timeout or CacheService.CACHE_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Failed to add cache marker {key}: {str(e)}")
+            return True
+
+    @staticmethod
+    def get_hot_cached_data(key: str) -> Optional[Any]:
+        """Получает данные из кэша процесса, а при промахе — из Redis с сохранением в кэш процесса.
+
+        Предназначен только для публичных данных с версионированными ключами: смена версии
+        делает локальные записи недостижимыми, остальные истекают через LOCAL_CACHE_TIMEOUT.
+
+        Args:
+            key (str): Ключ кэша.
+
+        Returns:
+            Данные из кэша или None, если кэш пуст.
+        """
+        local_cache = caches['local']
+        data = local_cache.get(key)
+        if data is not None:
+            return data
+        data = CacheService.get_cached_data(key)
+        if data is not None:
+            local_cache.set(key, data, CacheService.LOCAL_CACHE_TIMEOUT)
+        return data
+
+    @staticmethod
+    def get_cache_version(name: str) -> int:
+        """Возвращает текущую версию группы ключей кэша.
+
+        Версия входит в ключи группы: ее увеличение делает все старые ключи недостижимыми
+        без сканирования Redis. Начальное значение берется из текущего времени, чтобы после
+        вытеснения счетчика версия не вернулась к уже использованному значению.
+
+        Args:
+            name (str): Имя группы ключей (например, 'product_list').
+
+        Returns:
+            int: Текущая версия группы.
+        """
+        key = f"version:{name}"
+        try:
+            version = cache.get(key)
+            if version is None:
+                cache.add(key, time.time_ns(), timeout=None)
+                version = cache.get(key)
+            return version
+        except Exception as e:
+            logger.error(f"Failed to get cache version {key}: {str(e)}")
+            return 0
+
+    @staticmethod
+    def get_local_cache_version(name: str) -> int:
+        """Возвращает версию группы ключей из памяти процесса, обращаясь к Redis не чаще раза в LOCAL_VERSION_TIMEOUT.
+
+        Увеличение версии в другом процессе становится видно здесь с задержкой до
+        LOCAL_VERSION_TIMEOUT секунд; в текущем процессе — сразу (см. bump_cache_version).
+
+        Args:
+            name (str): Имя группы ключей (например, 'product_list').
+
+        Returns:
+            int: Версия группы.
+        """
+        local_cache = caches['local']
+        key = f"version:{name}"
+        version = local_cache.get(key)
+        if version is None:
+            version = CacheService.get_cache_version(name)
+            local_cache.set(key, version, CacheService.LOCAL_VERSION_TIMEOUT)
+        return version
+
+    @staticmethod
+    def bump_cache_version(name: str) -> None:
+        """Увеличивает версию группы ключей кэша, инвалидируя все ее ключи.
+
+        Args:
+            name (str): Имя группы ключей (например, 'product_list').
+
+        Returns:
+            None: Метод не возвращает значения.
+        """
+        key = f"version:{name}"
+        try:
+            cache.add(key, time.time_ns(), timeout=None)
+            cache.incr(key)
+            caches['local'].delete(key)
+            logger.debug(f"Bumped cache version for: {name}")
+        except Exception as e:
+            logger.error(f"Failed to bump cache version {key}: {str(e)}")
+
     # Специфичные методы для приложений
 
     @staticmethod
-    def cache_product_list(request):
-        """Кэширует список продуктов."""
-        return CacheService.get_cached_data(CacheService.build_cache_key(request, prefix="product_list"))
+    def build_product_list_key(request) -> str:
+        """Создает ключ кэша списка продуктов.
+
+        Публичный каталог кэшируется общим ключом для всех пользователей,
+        а выборка my_products — отдельно для каждого владельца. Ключ содержит версию
+        группы 'product_list', которая увеличивается при изменении продуктов. Для публичного
+        каталога версия читается из памяти процесса, поэтому после изменения продукта другие
+        процессы могут отдавать прежнюю страницу до LOCAL_VERSION_TIMEOUT секунд; владелец
+        в my_products видит изменения сразу.
+
+        Args:
+            request: HTTP-запрос с GET-параметрами.
+
+        Returns:
+            str: Ключ кэша с префиксом 'product_list'.
+        """
+        if request.GET.get('my_products') and request.user.is_authenticated:
+            prefix = f"product_list:v{CacheService.get_cache_version('product_list')}:user:{request.user.id}"
+        else:
+            prefix = f"product_list:v{CacheService.get_local_cache_version('product_list')}"
+        return CacheService.build_cache_key(request, prefix=prefix)
+
+    @staticmethod
+    def cache_product_list(request, key: Optional[str] = None):
+        """Кэширует список продуктов.
+
+        Публичные страницы каталога дополнительно кэшируются в памяти процесса.
+        Уже построенный ключ (build_product_list_key) можно передать в key, чтобы не строить его повторно.
+        """
+        key = key or CacheService.build_product_list_key(request)
+        if ':user:' in key:
+            return CacheService.get_cached_data(key)
+        return CacheService.get_hot_cached_data(key)
 
     @staticmethod
     def cache_product_details(product_id: int):
         """Кэширует детали продукта."""
         return CacheService.get_cached_data(f"product_detail:{product_id}")
 
+    @staticmethod
+    def cache_category_descendants(category_id: int):
+        """Кэширует ID категории и всех её потомков."""
+        return CacheService.get_cached_data(CacheService.build_category_descendants_key(category_id))
+
+    @staticmethod
+    def build_category_descendants_key(category_id: int) -> str:
+        """Создает версионированный ключ кэша ID потомков категории.
+
+        Args:
+            category_id (int): ID категории.
+
+        Returns:
+            str: Ключ кэша с префиксом 'category_descendants'.
+        """
+        version = CacheService.get_cache_version('category_descendants')
+        return f"category_descendants:v{version}:{category_id}"
+
     @staticmethod
     def cache_order_list(request, user_id: int, status: str = None):
         """Кэширует список заказов пользователя."""
@@ -1,6 +1,8 @@
+from django.core.cache import caches
 from django.db import IntegrityError
 from django.test import TestCase, RequestFactory
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.contrib.contenttypes.models import ContentType
 from unittest.mock import patch
 from apps.core.services.cache_services import CacheService
@@ -27,6 +29,56 @@ class CacheServiceTest(TestCase):
         self.assertTrue(key.startswith('product_list:'))
         self.assertEqual(len(key.split(':')[1]), 32)  # md5 hash
 
+    def test_build_product_list_key(self):
+        user = User.objects.create_user(username='seller', email='seller@example.com', password='pass')
+        own_request = self.factory.get('/api/products', {'my_products': 'true'})
+        own_request.user = user
+        other_request = self.factory.get('/api/products', {'my_products': 'true'})
+        other_request.user = User.objects.create_user(
+            username='other', email='other@example.com', password='pass'
+        )
+        self.request.user = user
+
+        version = CacheService.get_cache_version('product_list')
+        self.assertEqual(
+            CacheService.build_product_list_key(self.request),
+            CacheService.build_cache_key(self.request, f'product_list:v{version}')
+        )
+        key = CacheService.build_product_list_key(own_request)
+        self.assertTrue(key.startswith(f'product_list:v{version}:user:{user.id}:'))
+        self.assertNotEqual(key, CacheService.build_product_list_key(other_request))
+
+    def test_bump_cache_version(self):
+        CacheService.set_cached_data(CacheService.build_product_list_key(self.request), {'results': []})
+        version = CacheService.get_cache_version('product_list')
+        CacheService.bump_cache_version('product_list')
+        self.assertEqual(CacheService.get_cache_version('product_list'), version + 1)
+        self.assertIsNone(CacheService.cache_product_list(self.request))
+
+    def test_product_list_key_uses_local_version(self):
+        caches['local'].clear()
+        self.request.user = AnonymousUser()
+        key = CacheService.build_product_list_key(self.request)
+
+        # Повторное построение ключа не обращается к Redis за версией
+        with patch('django.core.cache.cache.get') as mock_get:
+            self.assertEqual(CacheService.build_product_list_key(self.request), key)
+            mock_get.assert_not_called()
+
+        # Увеличение версии в этом процессе сразу меняет ключ
+        CacheService.bump_cache_version('product_list')
+        self.assertNotEqual(CacheService.build_product_list_key(self.request), key)
+
+    def test_get_hot_cached_data(self):
+        caches['local'].clear()
+        CacheService.set_cached_data('hot_key', {'foo': 'bar'})
+        self.assertEqual(CacheService.get_hot_cached_data('hot_key'), {'foo': 'bar'})
+
+        # Повторное чтение обслуживается из памяти процесса без обращения к Redis
+        with patch('django.core.cache.cache.get') as mock_get:
+            self.assertEqual(CacheService.get_hot_cached_data('hot_key'), {'foo': 'bar'})
+            mock_get.assert_not_called()
+
     def test_set_and_get_cached_data(self):
         key = 'test_key'
         data = {'foo': 'bar'}
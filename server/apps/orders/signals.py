@@ -4,7 +4,7 @@ from django.dispatch import receiver
 from django.core.exceptions import ObjectDoesNotExist
 from apps.orders.models import Order
 from apps.orders.services.notification_services import NotificationService
-from apps.products.services.tasks import update_popularity_score
+from apps.products.services.tasks import schedule_popularity_update
 from apps.core.services.cache_services import CacheService
 from django.utils.translation import gettext_lazy as _
 
@@ -84,6 +84,8 @@ def order_post_save(sender, instance, created, **kwargs):
                 )
                 logger.info(f"Notification queued for status change, "
                             f"order={instance.id}, user={instance.user.id}")
+            # Статус заказа влияет на учет покупок в популярности всех его продуктов
+            schedule_popularity_update(set(instance.order_items.values_list('product_id', flat=True)))
 
         # Инвалидация кэша после изменения заказа
         CacheService.invalidate_cache(prefix=f"order_list:{instance.user.id}")
@@ -1,9 +1,7 @@
 import logging
 from django_elasticsearch_dsl import Document, fields
 from django_elasticsearch_dsl.registries import registry
-from django.db.models import Avg
 from apps.products.models import Product
-from apps.products.utils import calculate_popularity_score
 
 logger = logging.getLogger(__name__)
 
@@ -68,8 +66,13 @@ class ProductDocument(Document):
         }
 
     class Django:
-        """Сопоставление с моделью Django."""
+        """Сопоставление с моделью Django.
+
+        Документ синхронизируется задачами apps.products.services.tasks из сигналов products,
+        поэтому автоматическая синхронизация django_elasticsearch_dsl для него отключена.
+        """
         model = Product
+        ignore_signals = True
         fields = [
             'id',
         ]
@@ -127,7 +130,10 @@ class ProductDocument(Document):
             return {}
 
     def prepare_popularity_score(self, instance):
-        """Вычисляет показатель популярности для индексации.
+        """Возвращает сохраненный показатель популярности для индексации.
+
+        Показатель поддерживается задачами пересчета популярности, поэтому пакетная индексация
+        не выполняет дополнительных запросов на каждый продукт.
 
         Args:
             instance: Экземпляр Product.
@@ -136,13 +142,13 @@ class ProductDocument(Document):
             float: Float-значение показателя популярности.
         """
         try:
-            return calculate_popularity_score(instance)
+            return float(instance.popularity_score or 0.0)
         except Exception as e:
             logger.error(f"Failed to prepare popularity_score for product {instance.id}: {str(e)}")
             return 0.0
 
     def prepare_rating_avg(self, instance):
-        """Вычисляет средний рейтинг для индексации.
+        """Возвращает денормализованный средний рейтинг для индексации.
 
         Args:
             instance: Экземпляр Product.
@@ -151,8 +157,7 @@ class ProductDocument(Document):
             float: Float-значение среднего рейтинга.
         """
         try:
-            rating_avg = instance.reviews.aggregate(Avg('value'))['value__avg'] or 0.0
-            return float(rating_avg)
+            return float(instance.rating_avg or 0.0)
         except Exception as e:
             logger.error(f"Failed to prepare rating_avg for product {instance.id}: {str(e)}")
             return 0.0
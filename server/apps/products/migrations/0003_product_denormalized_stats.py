@@ -0,0 +1,62 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Avg, Count, FloatField, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_product_stats(apps, schema_editor):
+    """Заполняет денормализованные рейтинг и счетчики для существующих продуктов."""
+    Product = apps.get_model('products', 'Product')
+    Review = apps.get_model('reviews', 'Review')
+    OrderItem = apps.get_model('carts', 'OrderItem')
+
+    reviews = Review.objects.filter(product_id=OuterRef('pk')).order_by().values('product_id')
+    purchases = OrderItem.objects.filter(
+        product_id=OuterRef('pk'), order__isnull=False
+    ).order_by().values('product_id')
+    Product.objects.update(
+        rating_avg=Coalesce(
+            Subquery(reviews.annotate(avg=Avg('value')).values('avg')), 0.0, output_field=FloatField()
+        ),
+        review_count=Coalesce(
+            Subquery(reviews.annotate(cnt=Count('id')).values('cnt')), 0, output_field=IntegerField()
+        ),
+        purchase_count=Coalesce(
+            Subquery(purchases.annotate(cnt=Count('id')).values('cnt')), 0, output_field=IntegerField()
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_remove_product_products_pr_search__98d711_gin_and_more'),
+        ('reviews', '0002_remove_likes_count_field'),
+        ('carts', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='purchase_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество покупок'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(default=0.0, verbose_name='Средний рейтинг'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество отзывов'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-rating_avg'], name='rating_avg_desc_idx'),
+        ),
+        migrations.RunPython(backfill_product_stats, migrations.RunPython.noop),
+    ]
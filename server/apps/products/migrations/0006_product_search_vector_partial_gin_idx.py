@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:59
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations, models
+
+# Пересчет поисковых векторов с конфигурацией 'russian', совпадающей с SearchQuery
+REBUILD_SEARCH_VECTORS_SQL = """
+UPDATE products_product AS p
+SET search_vector =
+    setweight(to_tsvector('russian', coalesce(p.title, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce(p.description, '')), 'B') ||
+    setweight(to_tsvector('russian', coalesce(c.title, '')), 'C')
+FROM products_category AS c
+WHERE c.id = p.category_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_search_vector_gin_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='search_vector_gin_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(condition=models.Q(('is_active', True)), fields=['search_vector'], name='search_vector_gin_idx'),
+        ),
+        migrations.RunSQL(REBUILD_SEARCH_VECTORS_SQL, migrations.RunSQL.noop),
+    ]
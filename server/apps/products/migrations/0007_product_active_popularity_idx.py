@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_search_vector_partial_gin_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', '-popularity_score'], name='active_popularity_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:11
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы создаются без блокировки записи в таблицу товаров
+    atomic = False
+
+    dependencies = [
+        ('products', '0007_product_active_popularity_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Новый индекс создается до удаления старого, чтобы список не оставался без индекса
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-popularity_score'], include=('id', 'title', 'price', 'thumbnail', 'created', 'discount', 'stock', 'category', 'rating_avg'), name='active_popularity_cover_idx'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='product',
+            name='active_popularity_idx',
+        ),
+    ]
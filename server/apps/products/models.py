@@ -4,6 +4,7 @@ from django.contrib.auth import get_user_model
 from django.contrib.postgres.indexes import GinIndex, HashIndex
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
+from django.db.models.functions import Upper
 from mptt.models import MPTTModel, TreeForeignKey
 from django.core.validators import MinValueValidator, FileExtensionValidator, MaxValueValidator
 from django.utils.translation import gettext_lazy as _
@@ -116,6 +117,9 @@ class Product(TimeStampedModel):
         is_active: Статус активности.
         user: Пользователь, создавший продукт.
         search_vector: Вектор для полнотекстового поиска.
+        rating_avg: Средняя оценка по отзывам (денормализовано).
+        review_count: Количество отзывов (денормализовано).
+        purchase_count: Количество позиций в заказах (денормализовано).
     """
     title = models.CharField(max_length=255, verbose_name='Название')
     slug = models.SlugField(max_length=255, blank=True, unique=True, verbose_name='Slug')
@@ -160,6 +164,9 @@ class Product(TimeStampedModel):
     )
     search_vector = SearchVectorField(null=True, blank=True, verbose_name='Поисковый вектор')
     popularity_score = models.FloatField(default=0.0, verbose_name='Популярность')
+    rating_avg = models.FloatField(default=0.0, verbose_name='Средний рейтинг')
+    review_count = models.PositiveIntegerField(default=0, verbose_name='Количество отзывов')
+    purchase_count = models.PositiveIntegerField(default=0, verbose_name='Количество покупок')
     objects = ProductManager()
 
     class Meta:
@@ -173,7 +180,20 @@ class Product(TimeStampedModel):
             models.Index(fields=['discount']),
             models.Index(fields=['stock']),
             models.Index(fields=['popularity_score']),
+            # Покрывающий индекс для списка по умолчанию и keyset-пагинации: позволяет index-only scan
+            models.Index(
+                fields=['-popularity_score', 'id'],
+                name='active_popularity_id_cover_idx',
+                condition=models.Q(is_active=True),
+                include=[
+                    'title', 'price', 'thumbnail', 'created', 'discount', 'stock',
+                    'category', 'rating_avg'
+                ],
+            ),
+            models.Index(fields=['-rating_avg'], name='rating_avg_desc_idx'),
             models.Index(fields=['title', 'category'], name='title_category_idx'),
+            models.Index(Upper('title'), name='title_upper_idx'),
+            GinIndex(fields=['search_vector'], name='search_vector_gin_idx', condition=models.Q(is_active=True)),
         ]
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
@@ -220,10 +240,11 @@ class Product(TimeStampedModel):
             return
             
         category_title = self.category.title if self.category else ''
+        # Конфигурация должна совпадать с SearchQuery в ProductQueryService.search_products_db
         self.search_vector = (
-                SearchVector(Value(self.title), weight='A') +
-                SearchVector(Value(self.description), weight='B') +
-                SearchVector(Value(category_title), weight='C')
+                SearchVector(Value(self.title), config='russian', weight='A') +
+                SearchVector(Value(self.description), config='russian', weight='B') +
+                SearchVector(Value(category_title), config='russian', weight='C')
         )
 
     def save(self, *args, **kwargs) -> None:
@@ -1,5 +1,6 @@
 import logging
 from decimal import Decimal
+from django.utils import timezone
 from rest_framework import serializers
 from apps.products.models import Product, Category
 from apps.products.exceptions import InvalidProductData, ProductServiceException
@@ -148,13 +149,15 @@ class ProductDetailSerializer(serializers.ModelSerializer):
         slug_field='username'
     )
     has_user_reviewed = serializers.SerializerMethodField()
+    days_since_created = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = [
             'id', 'title', 'description', 'price', 'price_with_discount',
             'stock', 'discount', 'category', 'category_id', 'thumbnail',
-            'created', 'rating_avg', 'owner', 'is_active', 'has_user_reviewed'
+            'created', 'rating_avg', 'owner', 'is_active', 'has_user_reviewed',
+            'days_since_created'
         ]
         read_only_fields = ['id', 'created', 'owner', 'rating_avg']
 
@@ -173,6 +176,17 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             logger.error(f"Failed to calculate price with discount for product {obj.id}: {str(e)}")
             return obj.price
 
+    def get_days_since_created(self, obj: Product) -> int:
+        """Вычисляет количество дней с момента создания продукта.
+
+        Args:
+            obj: Объект Product.
+
+        Returns:
+            int: Количество полных дней с момента создания.
+        """
+        return (timezone.now() - obj.created).days
+
     def get_has_user_reviewed(self, obj: Product) -> bool:
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
@@ -1,11 +1,16 @@
 import logging
-from django.db import transaction
+from django.contrib.postgres.search import SearchVector
+from django.db import connection, transaction
+from django.db.models import Avg, Count, FloatField, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
-from typing import Dict, Any
+from typing import Dict, Any, List
 from django.core.exceptions import ValidationError
 from rest_framework.exceptions import PermissionDenied  # Добавляем импорт
 
-from apps.products.models import Product
+from apps.core.services.cache_services import CacheService
+from apps.core.utils import unique_slugify
+from apps.products.models import Category, Product
 from apps.products.exceptions import ProductServiceException, ProductNotFound
 
 User = get_user_model()
@@ -47,6 +52,57 @@ class ProductServices:
             logger.error(f"Failed to create product: {str(e)}, user={user_id}")
             raise ProductServiceException(f"Ошибка создания продукта: {str(e)}")
 
+    @staticmethod
+    def bulk_import_products(rows: List[Dict[str, Any]], user: User, batch_size: int = 500) -> List[int]:
+        """Импортирует набор продуктов пакетными INSERT без построчной обработки.
+
+        В отличие от create_product не вызывает Product.save() и сигналы post_save: поисковые векторы
+        заполняются одним UPDATE, кэши сбрасываются один раз, а документы Elasticsearch
+        индексируются одной задачей bulk_reindex_products после фиксации транзакции.
+
+        Args:
+            rows: Данные продуктов (название, цена, категория и т.д.).
+            user: Пользователь, импортирующий продукты.
+            batch_size: Количество продуктов в одном INSERT.
+
+        Returns:
+            List[int]: Идентификаторы созданных продуктов.
+
+        Raises:
+            ProductServiceException: Если данные некорректны или импорт не удался.
+        """
+        # Локальный импорт: модуль задач импортирует документы Elasticsearch
+        from apps.products.services.tasks import bulk_reindex_products
+
+        user_id = user.id if user else 'anonymous'
+        logger.info(f"Importing {len(rows)} products, user={user_id}")
+        try:
+            products = []
+            for data in rows:
+                product = Product(user=user, is_active=True, slug=unique_slugify(data.get('title', '')), **data)
+                # Внешние ключи проверяет ограничение БД, уникальность slug обеспечивает UUID
+                product.full_clean(exclude=['category', 'user'], validate_unique=False)
+                products.append(product)
+
+            with transaction.atomic():
+                product_ids = [p.pk for p in Product.objects.bulk_create(products, batch_size=batch_size)]
+                if connection.vendor == 'postgresql':
+                    # Конфигурация и веса совпадают с Product.update_search_vector
+                    category_title = Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('title'))
+                    Product.objects.filter(pk__in=product_ids).update(search_vector=(
+                        SearchVector('title', config='russian', weight='A') +
+                        SearchVector('description', config='russian', weight='B') +
+                        SearchVector(category_title, config='russian', weight='C')
+                    ))
+                CacheService.bump_cache_version("search_results")
+                CacheService.bump_cache_version("product_list")
+                transaction.on_commit(lambda: bulk_reindex_products.delay(product_ids))
+            logger.info(f"Imported {len(product_ids)} products, user={user_id}")
+            return product_ids
+        except Exception as e:
+            logger.error(f"Failed to import products: {str(e)}, user={user_id}")
+            raise ProductServiceException(f"Ошибка импорта продуктов: {str(e)}")
+
     @staticmethod
     @transaction.atomic
     def update_product(product_id: int, validated_data: Dict[str, Any], user: User) -> Product:
@@ -114,3 +170,34 @@ class ProductServices:
         except Exception as e:
             logger.error(f"Failed to delete product {product_id}: {str(e)}, user={user_id}")
             raise ProductServiceException(f"Ошибка удаления продукта: {str(e)}")
+
+    @staticmethod
+    def refresh_product_stats(product_id: int) -> None:
+        """Пересчитывает денормализованные рейтинг, количество отзывов и покупок продукта.
+
+        Выполняется одним UPDATE с подзапросами, поэтому запросы списка и деталей
+        продукта читают готовые значения вместо агрегатов по отзывам и заказам.
+
+        Args:
+            product_id: Идентификатор продукта.
+        """
+        # Локальный импорт: модели отзывов и корзины сами импортируют Product
+        from apps.reviews.models import Review
+        from apps.carts.models import OrderItem
+
+        reviews = Review.objects.filter(product_id=OuterRef('pk')).order_by().values('product_id')
+        purchases = OrderItem.objects.filter(
+            product_id=OuterRef('pk'), order__isnull=False
+        ).order_by().values('product_id')
+        updated = Product.objects.filter(pk=product_id).update(
+            rating_avg=Coalesce(
+                Subquery(reviews.annotate(avg=Avg('value')).values('avg')), 0.0, output_field=FloatField()
+            ),
+            review_count=Coalesce(
+                Subquery(reviews.annotate(cnt=Count('id')).values('cnt')), 0, output_field=IntegerField()
+            ),
+            purchase_count=Coalesce(
+                Subquery(purchases.annotate(cnt=Count('id')).values('cnt')), 0, output_field=IntegerField()
+            ),
+        )
+        logger.debug(f"Refreshed stats for product {product_id}, updated={updated}")
@@ -1,20 +1,33 @@
+import hashlib
 import logging
 
+from django.contrib.postgres.fields import ArrayField
 from django.contrib.postgres.search import SearchQuery, SearchRank
-from django.db.models import Q, F, Count, Avg, Case, When, IntegerField
-from django.db.models.functions import Coalesce, ExtractDay, Now
+from django.db.models import BigIntegerField, F, Func, IntegerField, Q, Value
+from elasticsearch.exceptions import ConnectionError as ESConnectionError, ConnectionTimeout, TransportError
 from elasticsearch_dsl import Search
 from django.conf import settings
+from mptt.utils import get_cached_trees
 
 from apps.products.models import Product, Category
 from apps.products.exceptions import ProductNotFound, InvalidCategoryError, ProductServiceException
 from apps.products.documents import ProductDocument
-from apps.products.utils import get_filter_params
-from typing import Any, Optional, Union
+from apps.products.utils import get_filter_params, get_request_params
+from apps.core.services.cache_services import CacheService
+from typing import Any, List, Optional, Tuple, Union
 from django.db.models import QuerySet
 
 logger = logging.getLogger(__name__)
 
+# Конфигурация полнотекстового поиска PostgreSQL
+_RU_SEARCH_CONFIG = 'russian'
+
+
+class ArrayPosition(Func):
+    """SQL-функция PostgreSQL array_position: позиция значения в массиве (начиная с 1)."""
+    function = 'array_position'
+    output_field = IntegerField()
+
 
 class ProductQueryService:
     """Сервис для выполнения запросов к продуктам.
@@ -22,12 +35,26 @@ class ProductQueryService:
     Предоставляет методы для фильтрации, сортировки, поиска продуктов с аннотациями и поиска через Elasticsearch.
     """
 
-    ALLOWED_ORDER_FIELDS = {
+    ALLOWED_ORDER_FIELDS = frozenset({
         '-popularity_score', 'price', '-price',
         '-created', 'rating_avg', '-rating_avg',
         'popularity_score', 'created'
-    }
+    })
+    DEFAULT_ORDERING = ('-popularity_score',)
+    LIST_FIELDS = (
+        'title', 'price', 'thumbnail', 'created', 'discount', 'stock',
+        'is_active', 'category_id', 'popularity_score', 'rating_avg'
+    )
     LARGE_PAGE_SIZE = 100
+    KEYSET_ORDERING = ('-popularity_score', 'id')
+    CATEGORY_CACHE_TIMEOUT = 60 * 60  # 1 час
+    SEARCH_CACHE_TIMEOUT = 60 * 5
+    # Circuit breaker для Elasticsearch: после ES_FAILURE_THRESHOLD ошибок за ES_CIRCUIT_TIMEOUT секунд
+    # поиск на ES_CIRCUIT_TIMEOUT секунд переключается на PostgreSQL
+    ES_FAILURE_THRESHOLD = 5
+    ES_CIRCUIT_TIMEOUT = 30
+    ES_CIRCUIT_KEY = 'es_circuit:products'
+    ES_UNAVAILABLE_ERRORS = (ESConnectionError, ConnectionTimeout, TransportError)
 
     @classmethod
     def get_base_queryset(cls, request: Any) -> QuerySet:
@@ -39,40 +66,42 @@ class ProductQueryService:
             QuerySet: Базовый QuerySet с продуктами.
         """
         logger.debug("Retrieving base queryset for active products")
-        my_products = request.GET.get('my_products', None)
         if settings.TESTING:
             return Product.objects.all()
-        elif my_products:
-            return Product.objects.filter(
-                user=request.user) \
-                if (my_products == 'true' and
-                    request.user.is_authenticated) else Product.objects.none()
+        if cls._wants_my_products(request):
+            return Product.objects.filter(user_id=request.user.id)
+        if get_request_params(request).my_products:
+            return Product.objects.none()
         return Product.objects.filter(is_active=True)
 
+    @staticmethod
+    def _wants_my_products(request: Any) -> bool:
+        """Проверяет, запрошены ли собственные продукты аутентифицированного пользователя."""
+        return get_request_params(request).my_products == 'true' and request.user.is_authenticated
+
     @classmethod
     def get_product_list(cls, request: Any, queryset: Optional[Any] = None) -> Any:
-        """Возвращает список продуктов с аннотациями и оптимизированными полями.
+        """Возвращает список продуктов с оптимизированными полями.
+
+        Рейтинг и счетчики денормализованы в модели Product, поэтому
+        агрегаты по отзывам и заказам для каждой строки не вычисляются.
+        Категория в списке отдается только по ID, поэтому JOIN с категориями не выполняется.
 
         Args:
             request: Request
             queryset: QuerySet продуктов. Если не указан, используется базовый queryset.
 
         Returns:
-            QuerySet с аннотациями и выбранными полями.
+            QuerySet с выбранными полями.
         """
-        logger.debug("Applying annotations for product list")
+        logger.debug("Selecting fields for product list")
         if queryset is None:
             queryset = cls.get_base_queryset(request)
-        return cls._apply_common_annotations(
-            queryset
-        ).select_related('category').only(
-            'title', 'price', 'thumbnail', 'created',
-            'discount', 'stock', 'is_active', 'category_id', 'popularity_score'
-        )
+        return queryset.only(*cls.LIST_FIELDS)
 
     @classmethod
     def get_single_product(cls, pk: int, request: Any) -> Product:
-        """Получает один продукт по ID с аннотациями.
+        """Получает один продукт по ID вместе с категорией и владельцем.
 
         Args:
             pk: Идентификатор продукта.
@@ -86,9 +115,7 @@ class ProductQueryService:
         """
         logger.info(f"Retrieving product with pk={pk}")
         try:
-            product = cls._apply_common_annotations(
-                Product.objects.all()
-            ).get(pk=pk)
+            product = Product.objects.select_related('category', 'user').get(pk=pk)
             logger.info(f"Retrieved product {pk}")
             return product
         except Product.DoesNotExist:
@@ -96,26 +123,47 @@ class ProductQueryService:
             raise ProductNotFound("Продукт не найден.")
 
     @staticmethod
-    def _apply_common_annotations(queryset: Any) -> Any:
-        """Применяет общие аннотации для рейтинга, покупок и популярности.
+    def build_category_tree(category: Category) -> Category:
+        """Загружает поддерево категории одним запросом для сериализации вложенных children.
 
         Args:
-            queryset: QuerySet продуктов.
+            category: Корневая категория поддерева.
 
         Returns:
-            QuerySet с аннотациями.
+            Category: Категория с заполненными cached_children на всех уровнях поддерева.
         """
-        logger.debug("Applying common annotations")
-        return queryset.annotate(
-            rating_avg=Coalesce(Avg('reviews__value'), 0.0),
-            purchase_count=Count(
-                'order_items',
-                filter=~Q(order_items__order=None),
-                distinct=True
-            ),
-            review_count=Count('reviews', distinct=True),
-            days_since_created=ExtractDay(Now() - F('created'))
+        return get_cached_trees(category.get_descendants(include_self=True))[0]
+
+    @classmethod
+    def get_category_descendant_ids(cls, category_id: int) -> List[int]:
+        """Возвращает ID категории и всех её потомков с кэшированием.
+
+        Args:
+            category_id: Идентификатор категории.
+
+        Returns:
+            List[int]: Список ID категории и её потомков.
+
+        Raises:
+            InvalidCategoryError: Если категория не найдена.
+        """
+        cached_ids = CacheService.cache_category_descendants(category_id)
+        if cached_ids is not None:
+            return cached_ids
+
+        try:
+            category = Category.objects.get(pk=category_id)
+        except Category.DoesNotExist:
+            logger.warning(f"Category {category_id} not found")
+            raise InvalidCategoryError("Категория не найдена.")
+
+        # Храним только ID, чтобы не материализовать объекты Category при каждом запросе
+        descendant_ids = list(category.get_descendants(include_self=True).values_list('id', flat=True))
+        CacheService.set_cached_data(
+            CacheService.build_category_descendants_key(category_id), descendant_ids,
+            timeout=cls.CATEGORY_CACHE_TIMEOUT
         )
+        return descendant_ids
 
     @classmethod
     def apply_common_filters(
@@ -149,13 +197,8 @@ class ProductQueryService:
         try:
             if isinstance(source, Search):
                 if category_id:
-                    try:
-                        category = Category.objects.get(pk=category_id)
-                        descendants = category.get_descendants(include_self=True)
-                        source = source.filter('terms', **{'category.id': [c.id for c in descendants]})
-                    except Category.DoesNotExist:
-                        logger.warning(f"Category {category_id} not found")
-                        raise InvalidCategoryError("Категория не найдена.")
+                    descendant_ids = cls.get_category_descendant_ids(category_id)
+                    source = source.filter('terms', **{'category.id': descendant_ids})
                 if min_price is not None or max_price is not None:
                     price_range = {}
                     if min_price is not None:
@@ -168,27 +211,53 @@ class ProductQueryService:
                 if in_stock:
                     source = source.filter('range', stock={'gt': 0})
             else:  # PostgreSQL QuerySet
-                if category_id:
-                    try:
-                        category = Category.objects.get(pk=category_id)
-                        descendants = category.get_descendants(include_self=True)
-                        source = source.filter(category__in=descendants)
-                    except Category.DoesNotExist:
-                        logger.warning(f"Category {category_id} not found")
-                        raise InvalidCategoryError("Категория не найдена.")
-                if min_price is not None:
-                    source = source.filter(price__gte=min_price)
-                if max_price is not None:
-                    source = source.filter(price__lte=max_price)
-                if min_discount is not None:
-                    source = source.filter(discount__gte=min_discount)
-                if in_stock:
-                    source = source.filter(stock__gt=0)
+                conditions = cls.build_filter_q(category_id, min_price, max_price, min_discount, in_stock)
+                if conditions:
+                    source = source.filter(conditions)
             return source
         except (TypeError, ValueError) as e:
             logger.warning(f"Invalid filter parameters: {str(e)}")
             raise InvalidCategoryError(f"Некорректные параметры фильтрации: {str(e)}")
 
+    @classmethod
+    def build_filter_q(
+            cls,
+            category_id: Optional[int] = None,
+            min_price: Optional[float] = None,
+            max_price: Optional[float] = None,
+            min_discount: Optional[float] = None,
+            in_stock: Optional[bool] = None,
+    ) -> Q:
+        """Собирает условия фильтрации QuerySet в один объект Q.
+
+        Условия применяются одним вызовом filter(), без промежуточных клонов QuerySet.
+
+        Args:
+            category_id: ID категории для фильтрации (включая подкатегории).
+            min_price: Минимальная цена.
+            max_price: Максимальная цена.
+            min_discount: Минимальная скидка (в процентах).
+            in_stock: Фильтр по наличию на складе.
+
+        Returns:
+            Q: Объединенное условие; пустой Q, если фильтры не заданы.
+
+        Raises:
+            InvalidCategoryError: Если категория не найдена.
+        """
+        conditions = Q()
+        if category_id:
+            conditions &= Q(category_id__in=cls.get_category_descendant_ids(category_id))
+        if min_price is not None:
+            conditions &= Q(price__gte=min_price)
+        if max_price is not None:
+            conditions &= Q(price__lte=max_price)
+        if min_discount is not None:
+            conditions &= Q(discount__gte=min_discount)
+        if in_stock:
+            conditions &= Q(stock__gt=0)
+        return conditions
+
     @classmethod
     def apply_filters(cls, queryset: Any, request: Any) -> Any:
         """Применяет фильтры к QuerySet на основе параметров запроса.
@@ -203,8 +272,8 @@ class ProductQueryService:
         Raises:
             InvalidCategoryError: Если параметры фильтрации некорректны.
         """
-        logger.debug(f"Applying filters with params={request.GET.dict()}")
         params = get_filter_params(request)
+        logger.debug(f"Applying filters with params={params}")
         return cls.apply_common_filters(queryset, **params)
 
     @classmethod
@@ -225,38 +294,229 @@ class ProductQueryService:
         Returns:
             Отсортированный QuerySet или объект Search.
         """
-        sort_by = request.GET.get('ordering')
-        is_search = bool(request.GET.get('q', '').strip())
-        logger.debug(f"Applying ordering with sort_by={sort_by}, is_search={is_search}")
+        if isinstance(queryset, Search):
+            sort_by = cls.resolve_ordering(request, default=None)
+            if sort_by:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Applying Elasticsearch sort: {sort_by}")
+                return queryset.sort(sort_by)
+            return queryset  # Сохраняем _score
+        sort_by = cls.resolve_ordering(request)
+        if not sort_by:
+            return queryset  # Сохраняем порядок _score через preserved_order
+        # Не пересортировываем QuerySet, если он уже упорядочен нужным образом
+        if tuple(queryset.query.order_by) == (sort_by,):
+            return queryset
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Applying QuerySet sort: {sort_by}")
+        return queryset.order_by(sort_by)
+
+    @classmethod
+    def resolve_ordering(cls, request: Any, default: Optional[str] = DEFAULT_ORDERING[0]) -> Optional[str]:
+        """Определяет поле сортировки по параметрам запроса.
+
+        Args:
+            request: HTTP-запрос с параметрами ordering и q.
+            default: Сортировка для не-поисковых запросов без допустимого ordering.
+
+        Returns:
+            Optional[str]: Поле сортировки или None, если нужно сохранить порядок релевантности.
+        """
+        params = get_request_params(request)
+        sort_by = params.ordering
+        is_search = bool(params.q)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Resolving ordering with sort_by={sort_by}, is_search={is_search}")
 
         if sort_by and sort_by not in cls.ALLOWED_ORDER_FIELDS:
             logger.warning(f"Invalid ordering field: {sort_by}")
             sort_by = None
+        if sort_by or is_search:
+            return sort_by
+        return default
 
-        if isinstance(queryset, Search):
-            if sort_by:
-                logger.debug(f"Applying Elasticsearch sort: {sort_by}")
-                return queryset.sort(sort_by)
-            logger.debug("No valid sort_by for Elasticsearch search, preserving _score")
-            return queryset  # Сохраняем _score
-        else:
-            if is_search:
-                if sort_by:
-                    logger.debug(f"Applying QuerySet sort for search: {sort_by}")
-                    return queryset.order_by(sort_by)
-                logger.debug("No valid sort_by for search QuerySet, preserving _score order")
-                return queryset  # Сохраняем порядок _score через preserved_order
-            else:
-                if sort_by:
-                    logger.debug(f"Applying QuerySet sort for non-search: {sort_by}")
-                    return queryset.order_by(sort_by)
-                logger.debug("No valid sort_by for non-search QuerySet, sorting by -popularity_score")
-                return queryset.order_by('-popularity_score')
+    @classmethod
+    def build_list_queryset(cls, queryset: QuerySet, request: Any) -> QuerySet:
+        """Строит QuerySet списка продуктов: фильтры, поля и сортировка за один проход.
+
+        Эквивалентно последовательному вызову apply_filters, get_product_list и apply_ordering,
+        но условия фильтрации собираются в один Q и QuerySet клонируется минимальное число раз.
+
+        Args:
+            queryset: Исходный QuerySet продуктов (базовый или результат поиска).
+            request: HTTP-запрос с параметрами фильтрации и сортировки.
+
+        Returns:
+            QuerySet: Готовый к пагинации QuerySet.
+
+        Raises:
+            ProductServiceException: Если параметры фильтрации некорректны.
+            InvalidCategoryError: Если категория не найдена.
+        """
+        conditions = cls.build_filter_q(**get_filter_params(request))
+        if conditions:
+            queryset = queryset.filter(conditions)
+        queryset = queryset.only(*cls.LIST_FIELDS)
+        sort_by = cls.resolve_ordering(request)
+        if sort_by and tuple(queryset.query.order_by) != (sort_by,):
+            queryset = queryset.order_by(sort_by)
+        return queryset
+
+    @staticmethod
+    def parse_cursor(cursor: str) -> Optional[Tuple[float, int]]:
+        """Разбирает курсор keyset-пагинации вида '<popularity_score>,<id>'.
+
+        Args:
+            cursor (str): Значение параметра cursor; пустая строка означает первую страницу.
+
+        Returns:
+            Optional[Tuple[float, int]]: Показатель популярности и ID последнего продукта или None.
+
+        Raises:
+            ValueError: Если курсор имеет некорректный формат.
+        """
+        if not cursor:
+            return None
+        score, _, pk = cursor.partition(',')
+        return float(score), int(pk)
+
+    @staticmethod
+    def encode_cursor(product: Product) -> str:
+        """Формирует курсор keyset-пагинации по последнему продукту страницы.
+
+        Args:
+            product (Product): Последний продукт страницы.
+
+        Returns:
+            str: Курсор вида '<popularity_score>,<id>'.
+        """
+        return f"{product.popularity_score!r},{product.pk}"
+
+    @classmethod
+    def apply_keyset(cls, queryset: QuerySet, after: Optional[Tuple[float, int]], page_size: int) -> QuerySet:
+        """Возвращает страницу продуктов после курсора в порядке (-popularity_score, id).
+
+        В отличие от OFFSET, стоимость запроса не зависит от номера страницы.
+
+        Args:
+            queryset: QuerySet продуктов.
+            after: Показатель популярности и ID последнего продукта предыдущей страницы или None.
+            page_size (int): Размер страницы.
+
+        Returns:
+            QuerySet: Срез QuerySet для одной страницы.
+        """
+        if after is not None:
+            score, pk = after
+            queryset = queryset.filter(
+                Q(popularity_score__lt=score) | Q(popularity_score=score, id__gt=pk)
+            )
+        return queryset.order_by(*cls.KEYSET_ORDERING)[:page_size]
+
+    @classmethod
+    def _search_product_ids(cls, query: str) -> List[int]:
+        """Выполняет полнотекстовый запрос к Elasticsearch и возвращает ID продуктов в порядке релевантности.
+
+        Args:
+            query: Поисковый запрос.
+
+        Returns:
+            List[int]: ID найденных продуктов, отсортированные по _score.
+        """
+        search = ProductDocument.search().query(
+            'bool',
+            should=[
+                # Точное совпадение с названием: вычисляется в filter-контексте (кэшируется,
+                # не участвует в расчете TF-IDF) и добавляет к _score постоянный бонус
+                {'constant_score': {
+                    'filter': {'term': {'title.raw': {'value': query, '_name': 'exact_title'}}},
+                    'boost': 10.0
+                }},
+
+                # Поиск по названию
+                {'match': {
+                    'title': {
+                        'query': query,
+                        'boost': 5.0,
+                        'operator': 'and'
+                    }
+                }},
+
+                # Поиск по n-граммам в названии
+                {'match': {
+                    'title.ngram': {
+                        'query': query,
+                        'boost': 3.0
+                    }
+                }},
+
+                # Поиск по описанию
+                {'match': {
+                    'description': {
+                        'query': query,
+                        'boost': 1.0,
+                        'operator': 'and'
+                    }
+                }}
+            ],
+            minimum_should_match=1
+        )
+
+        # Сортировка по релевантности
+        search = search.sort('_score')
+
+        # Получаем только ID продуктов из Elasticsearch: данные берутся из PostgreSQL,
+        # поэтому _source не передается по сети; общее число совпадений не используется
+        search = search.source(False).extra(track_total_hits=False).params(request_cache=True)[:cls.LARGE_PAGE_SIZE]
+        response = search.execute()
+
+        # Логируем результаты и их _score
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Elasticsearch hits: {[(hit.meta.id, hit.meta.score) for hit in response]}")
+        return [int(hit.meta.id) for hit in response]
+
+    @classmethod
+    def _search_product_ids_db(cls, request: Any, query: str, version: int) -> List[int]:
+        """Выполняет полнотекстовый поиск в PostgreSQL и кэширует ID результатов в порядке релевантности.
+
+        Кэш отделен от результатов Elasticsearch, чтобы после восстановления ES
+        поиск снова использовал его ранжирование.
+
+        Args:
+            request: HTTP-запрос с параметром поиска q.
+            query: Поисковый запрос.
+            version: Текущая версия группы кэша 'search_results'.
+
+        Returns:
+            List[int]: ID найденных продуктов, отсортированные по рангу.
+        """
+        cache_key = f"search_results:v{version}:db:{hashlib.sha1(query.encode()).hexdigest()}"
+        if cls._wants_my_products(request):
+            cache_key = f"{cache_key}:user:{request.user.id}"
+        product_ids = CacheService.get_cached_data(cache_key)
+        if product_ids is None:
+            queryset = cls.search_products_db(cls.get_base_queryset(request), request)
+            product_ids = list(queryset.values_list('id', flat=True)[:cls.LARGE_PAGE_SIZE])
+            CacheService.set_cached_data(cache_key, product_ids, timeout=cls.SEARCH_CACHE_TIMEOUT)
+        return product_ids
+
+    @classmethod
+    def _register_es_failure(cls) -> None:
+        """Учитывает ошибку Elasticsearch и размыкает circuit breaker при превышении порога."""
+        failures = CacheService.increment_counter(f"{cls.ES_CIRCUIT_KEY}:failures", timeout=cls.ES_CIRCUIT_TIMEOUT)
+        if failures >= cls.ES_FAILURE_THRESHOLD:
+            logger.error(f"Elasticsearch failed {failures} times, opening circuit for {cls.ES_CIRCUIT_TIMEOUT}s")
+            CacheService.set_cached_data(cls.ES_CIRCUIT_KEY, True, timeout=cls.ES_CIRCUIT_TIMEOUT)
 
     @classmethod
     def search_products(cls, request: Any) -> Any:
         """Выполняет поиск продуктов через Elasticsearch и возвращает QuerySet, отсортированный по релевантности.
 
+        Точный поиск (запрос в кавычках) выполняется в PostgreSQL по названию без учета регистра.
+        ID результатов полнотекстового поиска кэшируются по строке запроса.
+        При недоступности Elasticsearch выполняется полнотекстовый поиск в PostgreSQL, ID его результатов
+        кэшируются отдельно.
+
         Args:
             request: HTTP-запрос с параметром поиска q.
 
@@ -267,87 +527,47 @@ class ProductQueryService:
             ProductServiceException: При ошибках поиска.
         """
         try:
-            query = request.GET.get('q', '').strip()
+            query = get_request_params(request).q
             if not query:
                 logger.warning("Empty search query in search_products")
                 return cls.get_base_queryset(request).none()
 
-            search = ProductDocument.search()
-
-            # Формируем поисковый запрос
-            is_exact_search = query.startswith('"') and query.endswith('"')
-            if is_exact_search:
+            if query.startswith('"') and query.endswith('"'):
+                # Точный поиск по названию — это сравнение на равенство, его обслуживает
+                # функциональный индекс по UPPER(title) без обращения к Elasticsearch
                 query = query[1:-1].strip()  # Убираем кавычки
-                search = search.query(
-                    'bool',
-                    must=[
-                        {'term': {'title.raw': {'value': query, 'boost': 10.0}}}
-                    ]
-                )
-            else:
-                search = search.query(
-                    'bool',
-                    must=[
-                        {
-                            'bool': {
-                                'should': [
-                                    # Точное совпадение с названием (высокий вес)
-                                    {'term': {'title.raw': {'value': query, 'boost': 10.0}}},
-
-                                    # Поиск по названию
-                                    {'match': {
-                                        'title': {
-                                            'query': query,
-                                            'boost': 5.0,
-                                            'operator': 'and'
-                                        }
-                                    }},
-
-                                    # Поиск по n-граммам в названии
-                                    {'match': {
-                                        'title.ngram': {
-                                            'query': query,
-                                            'boost': 3.0
-                                        }
-                                    }},
-
-                                    # Поиск по описанию
-                                    {'match': {
-                                        'description': {
-                                            'query': query,
-                                            'boost': 1.0,
-                                            'operator': 'and'
-                                        }
-                                    }}
-                                ],
-                                'minimum_should_match': 1
-                            }
-                        }
-                    ]
-                )
-
-            # Сортировка по релевантности
-            search = search.sort('_score')
-
-            # Получаем ID продуктов из Elasticsearch
-            search = search[:cls.LARGE_PAGE_SIZE]
-            response = search.execute()
-
-            # Логируем результаты и их _score
-            logger.debug(f"Elasticsearch hits: {[(hit.meta.id, hit.meta.score) for hit in response]}")
-
-            if not response.hits:
+                logger.debug(f"Exact title search in PostgreSQL: query={query}")
+                return cls.get_base_queryset(request).filter(title__iexact=query)
+
+            # Результаты полнотекстового поиска кэшируются по нормализованному запросу
+            # Версия сбрасывается сигналами Product, старые ключи истекают по TTL
+            version = CacheService.get_cache_version('search_results')
+            cache_key = f"search_results:v{version}:{hashlib.sha1(query.encode()).hexdigest()}"
+            product_ids = CacheService.get_cached_data(cache_key)
+            if product_ids is None:
+                if CacheService.get_cached_data(cls.ES_CIRCUIT_KEY):
+                    logger.debug("Elasticsearch circuit is open, searching in PostgreSQL")
+                    product_ids = cls._search_product_ids_db(request, query, version)
+                else:
+                    try:
+                        product_ids = cls._search_product_ids(query)
+                        CacheService.set_cached_data(cache_key, product_ids, timeout=cls.SEARCH_CACHE_TIMEOUT)
+                    except cls.ES_UNAVAILABLE_ERRORS as e:
+                        logger.warning(f"Elasticsearch unavailable, falling back to PostgreSQL search: {str(e)}")
+                        cls._register_es_failure()
+                        product_ids = cls._search_product_ids_db(request, query, version)
+
+            if not product_ids:
                 return cls.get_base_queryset(request).none()
 
             # Получаем продукты из базы данных с сохранением порядка из Elasticsearch
-            product_ids = [hit.meta.id for hit in response]
             logger.debug(f"Final product_ids order: {product_ids}")
             products = cls.get_base_queryset(request).filter(id__in=product_ids)
 
-            # Сохраняем порядок сортировки из Elasticsearch
-            preserved_order = Case(
-                *[When(pk=pk, then=pos) for pos, pk in enumerate(product_ids)],
-                output_field=IntegerField()
+            # Сохраняем порядок сортировки из Elasticsearch одним выражением array_position
+            preserved_order = ArrayPosition(
+                Value(product_ids, output_field=ArrayField(BigIntegerField())),
+                F('id'),
             )
             return products.order_by(preserved_order)
 
@@ -355,8 +575,8 @@ class ProductQueryService:
             logger.error(f"Error in search_products: {str(e)}")
             raise ProductServiceException(f"Ошибка при поиске продуктов: {str(e)}")
 
-    @staticmethod
-    def search_products_db(queryset: Any, request: Any) -> Any:
+    @classmethod
+    def search_products_db(cls, queryset: Any, request: Any) -> Any:
         """Выполняет поиск продуктов по текстовому запросу в базе данных.
 
         Args:
@@ -369,16 +589,16 @@ class ProductQueryService:
         Raises:
             ProductServiceException: Если поисковый запрос пустой или некорректен.
         """
-        search_query = request.GET.get('q')
+        search_query = get_request_params(request).q
         logger.info(f"Searching products with query={search_query}")
         if not search_query:
             logger.warning("Empty search query")
             raise ProductServiceException("Пустой поисковый запрос.")
         try:
-            query = SearchQuery(search_query, config='russian', search_type='websearch')
+            query = SearchQuery(search_query, config=_RU_SEARCH_CONFIG, search_type='websearch')
             return queryset.annotate(
-                rank=SearchRank('search_vector', query)
-            ).filter(search_vector=query)
+                rank=SearchRank(F('search_vector'), query)
+            ).filter(search_vector=query).order_by('-rank').only(*cls.LIST_FIELDS)
         except Exception as e:
             logger.error(f"Search failed: {str(e)}")
             raise ProductServiceException(f"Ошибка поиска: {str(e)}")
@@ -1,13 +1,51 @@
 import logging
 from celery import shared_task
+from django.conf import settings
+from django.db import transaction
 
 from apps.core.services.cache_services import CacheService
 from apps.products.models import Product
 from apps.products.documents import ProductDocument
-from apps.products.utils import calculate_popularity_score
+from apps.products.utils import popularity_score_expression
 
 logger = logging.getLogger(__name__)
 
+ES_DEBOUNCE_TIMEOUT = 5  # Окно объединения обновлений документа продукта в секундах
+ES_BULK_CHUNK_SIZE = 500  # Количество документов в одном bulk-запросе к Elasticsearch
+
+
+def schedule_elasticsearch_update(product_id: int) -> None:
+    """Ставит в очередь отложенное обновление документа продукта в Elasticsearch.
+
+    Повторные вызовы для того же продукта в пределах ES_DEBOUNCE_TIMEOUT объединяются в одну задачу,
+    которая индексирует актуальное состояние продукта на момент выполнения.
+
+    Args:
+        product_id (int): Идентификатор продукта.
+
+    Returns:
+        None: Функция ничего не возвращает.
+    """
+    if CacheService.add_if_absent(f"esdebounce:{product_id}", timeout=ES_DEBOUNCE_TIMEOUT):
+        update_elasticsearch_task.apply_async((product_id,), countdown=ES_DEBOUNCE_TIMEOUT)
+    else:
+        logger.debug(f"Elasticsearch update for product {product_id} already scheduled")
+
+
+def delete_product_document(product_id: int) -> None:
+    """Удаляет документ продукта из Elasticsearch одним запросом DELETE по ID.
+
+    Отсутствие документа в индексе не считается ошибкой.
+
+    Args:
+        product_id (int): Идентификатор продукта.
+
+    Returns:
+        None: Функция ничего не возвращает.
+    """
+    client = ProductDocument._get_connection()
+    client.options(ignore_status=404).delete(index=ProductDocument._index._name, id=product_id)
+
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=60)
 def update_elasticsearch_task(self, product_id: int, delete: bool = False) -> None:
@@ -28,23 +66,25 @@ def update_elasticsearch_task(self, product_id: int, delete: bool = False) -> No
     try:
         if delete:
             # При удалении продукта удаляем его документ из Elasticsearch
-            doc = ProductDocument.get(id=product_id)
-            doc.delete()
+            delete_product_document(product_id)
             logger.info(f"Deleted product {product_id} from Elasticsearch")
+            CacheService.bump_cache_version("search_results")
             return
 
-        # При обновлении или создании
-        product = Product.objects.get(pk=product_id)
-        if product.should_update_elasticsearch():
-            if product.is_active:
-                doc = ProductDocument.from_instance(product)
-                doc.save()
-                logger.info(f"Updated Elasticsearch for product {product_id}")
-            else:
-                # Если продукт неактивен, удаляем его из индекса
-                doc = ProductDocument.get(id=product_id)
-                doc.delete()
-                logger.info(f"Removed inactive product {product_id} from Elasticsearch")
+        # Снимаем маркер до чтения продукта, чтобы изменения во время индексации запланировали новую задачу
+        CacheService.invalidate_cache(prefix="esdebounce", pk=product_id)
+
+        # При обновлении или создании индексируем текущее состояние продукта
+        product = Product.objects.select_related('category').get(pk=product_id)
+        if product.is_active:
+            ProductDocument().update(product)
+            logger.info(f"Updated Elasticsearch for product {product_id}")
+        else:
+            # Если продукт неактивен, удаляем его из индекса
+            delete_product_document(product_id)
+            logger.info(f"Removed inactive product {product_id} from Elasticsearch")
+        # Сбрасываем кэш поиска после записи в индекс: поиски в окне debounce могли закэшировать старые ID
+        CacheService.bump_cache_version("search_results")
 
     except Product.DoesNotExist:
         logger.warning(f"Product {product_id} not found")
@@ -54,6 +94,66 @@ def update_elasticsearch_task(self, product_id: int, delete: bool = False) -> No
         raise self.retry(exc=e)
 
 
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def bulk_reindex_products(self, product_ids=None) -> None:
+    """Переиндексирует продукты в Elasticsearch пакетными bulk-запросами.
+
+    Активные продукты индексируются, документы неактивных и удаленных продуктов удаляются.
+    Без списка идентификаторов переиндексируется весь каталог.
+
+    Args:
+        self: Экземпляр задачи Celery.
+        product_ids (list[int], optional): Идентификаторы продуктов. По умолчанию None.
+
+    Returns:
+        None: Функция ничего не возвращает.
+
+    Raises:
+        Exception: Если bulk-запрос к Elasticsearch не удался.
+    """
+    queryset = Product.objects.all() if product_ids is None else Product.objects.filter(pk__in=product_ids)
+    active = queryset.filter(is_active=True).select_related('category')
+    if product_ids is None:
+        stale_ids = queryset.filter(is_active=False).values_list('pk', flat=True)
+    else:
+        stale_ids = set(product_ids).difference(active.values_list('pk', flat=True))
+
+    doc = ProductDocument()
+    try:
+        indexed, _ = doc.update(active.iterator(chunk_size=ES_BULK_CHUNK_SIZE), chunk_size=ES_BULK_CHUNK_SIZE)
+        # Отсутствующие в индексе документы не считаются ошибкой при удалении
+        deleted, _ = doc.update(
+            (Product(pk=pk) for pk in stale_ids), action='delete',
+            chunk_size=ES_BULK_CHUNK_SIZE, raise_on_error=False
+        )
+        logger.info(f"Bulk reindexed {indexed} products, removed {deleted} documents from Elasticsearch")
+        CacheService.bump_cache_version("search_results")
+    except Exception as e:
+        logger.error(f"Failed to bulk reindex products in Elasticsearch: {str(e)}")
+        raise self.retry(exc=e)
+
+
+def schedule_popularity_update(product_ids) -> None:
+    """Запускает пересчет популярности продуктов.
+
+    При включенной настройке INLINE_POPULARITY пересчет выполняется в текущем процессе после фиксации
+    транзакции, иначе ставится задача в очередь Celery.
+
+    Args:
+        product_ids (list[int]): Идентификаторы продуктов для обновления.
+
+    Returns:
+        None: Функция ничего не возвращает.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    if settings.INLINE_POPULARITY:
+        transaction.on_commit(lambda: update_popularity_scores_bulk(product_ids))
+    else:
+        update_popularity_scores_bulk.delay(product_ids)
+
+
 @shared_task
 def update_popularity_score(product_id):
     """Обновляет показатель популярности продукта.
@@ -63,28 +163,56 @@ def update_popularity_score(product_id):
 
     Returns:
         None: Функция ничего не возвращает.
-
-    Raises:
-        Product.DoesNotExist: Если продукт не найден.
-        Exception: Если обновление популярности или инвалидация кэша не удались.
     """
     logger.info(f"Starting update_popularity_score for product {product_id}")
+    update_popularity_scores_bulk([product_id])
+
+
+@shared_task
+def update_popularity_scores_bulk(product_ids):
+    """Обновляет показатель популярности группы продуктов одним запросом UPDATE.
+
+    Кэш списка продуктов сбрасывается один раз, кэш деталей — одной командой для всех продуктов.
+
+    Args:
+        product_ids (list[int]): Идентификаторы продуктов для обновления.
+
+    Returns:
+        None: Функция ничего не возвращает.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
     try:
-        product = Product.objects.get(pk=product_id)
-        new_score = calculate_popularity_score(product)
-        logger.debug(f"Calculated popularity_score={new_score} for product {product_id}")
-        product.popularity_score = new_score
-        product.save(update_fields=['popularity_score'])
+        updated = Product.objects.filter(pk__in=product_ids).update(
+            popularity_score=popularity_score_expression()
+        )
         # Инвалидация кэша
         try:
-            CacheService.invalidate_cache(prefix="product_list")
-            CacheService.invalidate_cache(prefix="product_detail", pk=product.id)
-            logger.info(f"Invalidated cache for product {product_id} (product_detail, product_list)")
+            CacheService.bump_cache_version("product_list")
+            CacheService.invalidate_keys([f"product_detail:{pk}" for pk in product_ids])
+            logger.info(f"Invalidated cache for products {product_ids} (product_detail, product_list)")
         except Exception as cache_error:
-            logger.error(f"Failed to invalidate cache for product {product_id}: {str(cache_error)}")
+            logger.error(f"Failed to invalidate cache for products {product_ids}: {str(cache_error)}")
 
-        logger.info(f"Updated popularity_score for product {product_id}")
-    except Product.DoesNotExist:
-        logger.warning(f"Product {product_id} not found")
+        logger.info(f"Updated popularity_score for {updated} products")
+    except Exception as e:
+        logger.error(f"Failed to update popularity_score for products {product_ids}: {str(e)}")
+
+
+@shared_task
+def recompute_popularity_scores():
+    """Пересчитывает показатель популярности всех активных продуктов одним запросом UPDATE.
+
+    Составляющая новизны зависит от текущей даты, поэтому пересчет выполняется ежедневно.
+
+    Returns:
+        None: Функция ничего не возвращает.
+    """
+    logger.info("Starting recompute_popularity_scores")
+    try:
+        updated = Product.objects.filter(is_active=True).update(popularity_score=popularity_score_expression())
+        CacheService.bump_cache_version("product_list")
+        logger.info(f"Recomputed popularity_score for {updated} products")
     except Exception as e:
-        logger.error(f"Failed to update popularity_score for product {product_id}: {str(e)}")
+        logger.error(f"Failed to recompute popularity scores: {str(e)}")
@@ -7,13 +7,14 @@
 import logging
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from apps.products.models import Product
-from apps.products.services.tasks import update_elasticsearch_task
+from apps.core.services.cache_services import CacheService
+from apps.products.models import Product, Category
+from apps.products.services.tasks import update_elasticsearch_task, schedule_elasticsearch_update
 
 logger = logging.getLogger(__name__)
 
 
-@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Product, dispatch_uid='products.product_es_update')
 def update_product_in_elasticsearch(sender, instance, created, **kwargs):
     """Запускает асинхронную задачу для обновления данных продукта в Elasticsearch.
 
@@ -36,10 +37,12 @@ def update_product_in_elasticsearch(sender, instance, created, **kwargs):
         logger.debug(f"Skipping signal for product {instance.id} due to popularity_score update")
         return
     logger.info(f"{action} product: title={instance.title}, user={user_id}, is_active={instance.is_active}")
-    update_elasticsearch_task.delay(instance.id)
+    CacheService.bump_cache_version("search_results")
+    CacheService.bump_cache_version("product_list")
+    schedule_elasticsearch_update(instance.id)
 
 
-@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Product, dispatch_uid='products.product_es_delete')
 def delete_product_from_elasticsearch(sender, instance, **kwargs):
     """Запускает асинхронную задачу для удаления данных продукта из Elasticsearch.
 
@@ -56,4 +59,21 @@ def delete_product_from_elasticsearch(sender, instance, **kwargs):
     """
     user_id = instance.user.id if instance.user else 'anonymous'
     logger.info(f"Deleting product from Elasticsearch: title={instance.title}, user={user_id}")
+    CacheService.bump_cache_version("search_results")
+    CacheService.bump_cache_version("product_list")
     update_elasticsearch_task.delay(instance.id, delete=True)
+
+
+@receiver([post_save, post_delete], sender=Category, dispatch_uid='products.category_descendants_cache')
+def invalidate_category_descendants_cache(sender, instance, **kwargs):
+    """Инвалидирует кэш ID потомков категорий при изменении дерева категорий.
+
+    Args:
+        sender: Класс модели, отправивший сигнал.
+        instance: Экземпляр модели Category, который был изменен.
+        **kwargs: Дополнительные аргументы, переданные сигналом.
+    """
+    # Изменение узла меняет наборы потомков у всех его предков (в том числе прежних при переносе),
+    # поэтому сбрасываем версию всей группы ключей
+    CacheService.bump_cache_version("category_descendants")
+    logger.info(f"Invalidated category descendants cache for category={instance.id}")
@@ -4,19 +4,143 @@
 Содержит тесты для всех API endpoints.
 """
 
+import json
+import re
+from collections import Counter
+from contextlib import contextmanager
 from decimal import Decimal
-from django.test import TestCase, override_settings
+from unittest.mock import patch
+from django.db import connection
+from django.test import TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from elastic_transport import Transport
 from rest_framework import status
 from rest_framework.test import APIClient
+from apps.core.utils import unique_slugify
+from apps.products.documents import ProductDocument
 from apps.products.models import Category, Product
-
-from django.core.management import call_command
+from apps.products.services.query_services import ProductQueryService
+from apps.products.views import CachedCountPaginator
 
 User = get_user_model()
 
+# URL без параметров разрешаются один раз при загрузке модуля
+PRODUCT_LIST_URL = reverse('products:product_list')
+PRODUCT_CREATE_URL = reverse('products:product_create')
+CATEGORY_LIST_URL = reverse('products:category_list')
+
+# Цена по умолчанию для продуктов, создаваемых пачками
+DEFAULT_PRICE = Decimal('10.00')
+
+# Тела PATCH-запросов кодируются в JSON один раз
+UPDATE_BODY = json.dumps({'title': 'Updated Product', 'price': '299.99'}).encode()
+HACK_BODY = json.dumps({'title': 'Hacked Product'}).encode()
+
+# Загружаемые в тестах изображения сохраняются в память, без записи в MEDIA_ROOT
+IN_MEMORY_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+def use_isolated_cache(testcase):
+    """Подключает тесту собственные экземпляры LocMemCache.
+
+    Каждый тест получает пустые кэши (общий и локальный) без сброса общего хранилища,
+    а настройка восстанавливается автоматически по завершении теста.
+
+    Args:
+        testcase: Экземпляр TestCase, для которого подменяется кэш.
+    """
+    testcase.enterContext(override_settings(CACHES={
+        alias: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'{testcase.id()}:{alias}',
+        }
+        for alias in ('default', 'local')
+    }))
+
+
+def bulk_create_products(rows, **defaults):
+    """Создает продукты одним INSERT без сигналов сохранения.
+
+    Args:
+        rows: Итерируемое словарей с полями каждого продукта (обязательно title).
+        **defaults: Поля, общие для всех продуктов (category, user и т.д.).
+
+    Returns:
+        list: Созданные продукты.
+    """
+    defaults = {'price': DEFAULT_PRICE, 'stock': 1, 'is_active': True, **defaults}
+    return Product.objects.bulk_create([
+        Product(**{**defaults, 'slug': unique_slugify(row['title']), **row})
+        for row in rows
+    ])
+
+
+def seed_products(template, count):
+    """Клонирует продукт-шаблон на стороне БД одним INSERT ... SELECT.
+
+    Строки не материализуются в Python, поэтому так можно быстро получить тысячи
+    продуктов для проверки масштабирования. Требует PostgreSQL (generate_series).
+
+    Args:
+        template: Продукт, значения полей которого копируются.
+        count: Количество создаваемых копий.
+    """
+    table = Product._meta.db_table
+    columns = ', '.join(
+        field.column for field in Product._meta.concrete_fields if field.column not in ('id', 'title', 'slug')
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (title, slug, {columns}) "
+            f"SELECT title || '-' || gs, slug || '-' || gs, {columns} "
+            f"FROM {table}, generate_series(1, %s) gs WHERE id = %s",
+            [count, template.pk]
+        )
+
+
+@contextmanager
+def catch_nplusone(testcase):
+    """Проверяет отсутствие N+1 запросов внутри блока.
+
+    Ленивые загрузки связей (product.category, product.user, category.children) проявляются
+    как один и тот же SELECT, повторенный с разными параметрами. Литералы в SQL заменяются
+    плейсхолдерами, и повтор шаблона запроса считается ошибкой.
+
+    Args:
+        testcase: Экземпляр TestCase для вызова assert-методов.
+    """
+    with CaptureQueriesContext(connection) as ctx:
+        yield ctx
+    templates = Counter()
+    for query in ctx.captured_queries:
+        sql = query['sql']
+        if not sql.lstrip().upper().startswith('SELECT'):
+            continue
+        sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+        sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+        sql = re.sub(r'IN \((?:\?,\s*)*\?\)', 'IN (...)', sql)
+        templates[sql] += 1
+    repeated = [sql for sql, count in templates.items() if count > 1]
+    testcase.assertFalse(repeated, f"Repeated queries (N+1): {repeated}")
+
+
+@contextmanager
+def count_es_requests():
+    """Считает HTTP-запросы к Elasticsearch внутри блока, не отправляя их.
+
+    Yields:
+        MagicMock: Подмененный Transport.perform_request; call_count - число запросов.
+    """
+    with patch.object(Transport, 'perform_request') as perform_request:
+        yield perform_request
+
 
 @override_settings(ELASTICSEARCH_DSL_AUTOSYNC=False)
 class CategoryAPITests(TestCase):
@@ -25,34 +149,36 @@ class CategoryAPITests(TestCase):
     Проверяет операции чтения категорий через API.
     """
 
-    def setUp(self):
-        """Подготовка тестовых данных для каждого теста."""
-        self.client = APIClient()
-        self.user = User.objects.create_user(
+    # Клиент создается TestCase для каждого теста; APIClient вместо стандартного Client
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        """Подготовка тестовых данных, общих для всех тестов класса."""
+        cls.user = User.objects.create_user(
             username='testuser',
             email='test@example.com',
             password='testpass123'
         )
 
         # Создаем тестовые категории
-        self.electronics = Category.objects.create(
+        cls.electronics = Category.objects.create(
             title='Электроника',
             description='Электронные устройства'
         )
-        self.phones = Category.objects.create(
+        cls.phones = Category.objects.create(
             title='Смартфоны',
             description='Мобильные телефоны',
-            parent=self.electronics
+            parent=cls.electronics
         )
 
-    def tearDown(self):
-        """Очистка тестовых данных после каждого теста."""
-        Category.objects.all().delete()
-        User.objects.all().delete()
+    def setUp(self):
+        """Подготовка изолированного кэша для каждого теста."""
+        use_isolated_cache(self)
 
     def test_category_list(self):
         """Тест получения списка категорий."""
-        response = self.client.get(reverse('products:category_list'))
+        response = self.client.get(CATEGORY_LIST_URL)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)  # Только корневая категория
         self.assertEqual(response.data[0]['title'], 'Электроника')
@@ -67,45 +193,73 @@ class CategoryAPITests(TestCase):
         self.assertTrue('children' in response.data)
         self.assertEqual(len(response.data['children']), 1)
 
-
-@override_settings(ELASTICSEARCH_DSL_AUTOSYNC=True)  # Включаем синхронизацию с Elasticsearch
+    def test_category_detail_query_count(self):
+        """Тест постоянного числа запросов деталей категории при росте дерева."""
+        url = reverse('products:category_detail', kwargs={'pk': self.electronics.pk})
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+        # Вложенные подкатегории не добавляют запросов
+        for title in ('iPhone', 'Android'):
+            Category.objects.create(title=title, parent=self.phones)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['children'][0]['children']), 2)
+
+    def test_category_endpoints_no_nplusone(self):
+        """Тест отсутствия ленивых загрузок дочерних категорий."""
+        for title in ('iPhone', 'Android'):
+            Category.objects.create(title=title, parent=self.phones)
+        Category.objects.create(title='Ноутбуки', parent=self.electronics)
+        with catch_nplusone(self):
+            self.client.get(CATEGORY_LIST_URL)
+        with catch_nplusone(self):
+            self.client.get(reverse('products:category_detail', kwargs={'pk': self.electronics.pk}))
+
+
+@override_settings(ELASTICSEARCH_DSL_AUTOSYNC=False, STORAGES=IN_MEMORY_STORAGES)
 class ProductAPITests(TestCase):
     """Тесты для API продуктов.
 
     Проверяет CRUD операции с продуктами через API.
     """
 
-    def setUp(self):
-        self.client = APIClient()
-        self.user = User.objects.create_user(
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        """Подготовка тестовых данных, общих для всех тестов класса."""
+        cls.user = User.objects.create_user(
             username='testuser',
             email='test@example.com',
             password='testpass123'
         )
-        self.client.force_authenticate(user=self.user)
-
-        self.category = Category.objects.create(
+        cls.category = Category.objects.create(
             title='Электроника',
             description='Электронные устройства'
         )
-
-        self.image = SimpleUploadedFile(
-            name='test_image.jpg',
-            content=b'GIF87a\x01\x00\x01\x00\x80\x01\x00\x00\x00\x00ccc,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;',
-            content_type='image/jpeg'
-        )
-
-        self.product = Product.objects.create(
+        cls.product = Product.objects.create(
             title='iPhone 15',
             description='Новый iPhone',
             price=Decimal('999.99'),
             stock=10,
-            category=self.category,
-            user=self.user,
+            category=cls.category,
+            user=cls.user,
             is_active=True,
             discount=Decimal('0.00')
         )
 
+    def setUp(self):
+        """Подготовка клиента и данных запроса для каждого теста."""
+        self.client.force_authenticate(user=self.user)
+
+        # Файл загрузки читается при каждом запросе, поэтому создается для каждого теста
+        self.image = SimpleUploadedFile(
+            name='test_image.jpg',
+            content=b'GIF87a\x01\x00\x01\x00\x80\x01\x00\x00\x00\x00ccc,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;',
+            content_type='image/jpeg'
+        )
+
         # Добавляем valid_payload
         self.valid_payload = {
             'title': 'New Product',
@@ -116,28 +270,66 @@ class ProductAPITests(TestCase):
             'thumbnail': self.image,
             'discount': '0.00'
         }
-
-        from django.core.cache import cache
-        cache.clear()  # Очистка кэша перед тестами
-
-        # Переиндексируем Elasticsearch
-        call_command('search_index', '--rebuild', '-f')
-
-    def tearDown(self):
-        """Очистка тестовых данных после каждого теста."""
-        Product.objects.all().delete()
-        Category.objects.all().delete()
-        User.objects.all().delete()
-        from django.core.cache import cache
-        cache.clear()  # Очистка кэша после тестов
+        use_isolated_cache(self)
 
     def test_product_list(self):
         """Тест получения списка продуктов."""
-        response = self.client.get(reverse('products:product_list'))
+        response = self.client.get(PRODUCT_LIST_URL)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 1)
         self.assertEqual(response.data['results'][0]['title'], 'iPhone 15')
 
+    def test_product_list_query_count(self):
+        """Тест постоянного числа запросов списка продуктов при росте их количества."""
+        url = PRODUCT_LIST_URL
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+        bulk_create_products(
+            ({'title': f'Product {i}'} for i in range(9)), category=self.category, user=self.user
+        )
+        cache.clear()
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 10)
+
+        # Фильтры и сортировка не меняют число запросов: COUNT и выборка страницы
+        cache.clear()
+        with self.assertNumQueries(2):
+            self.client.get(url, {'min_price': '5', 'in_stock': 'true', 'ordering': 'price'})
+
+    def test_product_detail_query_count(self):
+        """Тест постоянного числа запросов деталей продукта при росте дерева категорий."""
+        url = reverse('products:product_detail', kwargs={'pk': self.product.pk})
+        # Продукт с категорией и владельцем, поддерево категории, проверка отзыва пользователя
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+        phones = Category.objects.create(title='Смартфоны', parent=self.category)
+        Category.objects.create(title='iPhone', parent=phones)
+        cache.clear()
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['category']['children'][0]['children']), 1)
+
+    def test_product_endpoints_no_nplusone(self):
+        """Тест отсутствия ленивых загрузок категорий и владельцев продуктов."""
+        other_user = User.objects.create_user(username='otheruser', password='testpass123')
+        subcategory = Category.objects.create(title='Смартфоны', parent=self.category)
+        bulk_create_products(
+            {
+                'title': f'Product {i}',
+                'category': subcategory if i % 2 else self.category,
+                'user': other_user if i % 2 else self.user,
+            }
+            for i in range(4)
+        )
+        with catch_nplusone(self):
+            response = self.client.get(PRODUCT_LIST_URL)
+        self.assertEqual(len(response.data['results']), 5)
+        with catch_nplusone(self):
+            self.client.get(reverse('products:product_detail', kwargs={'pk': self.product.pk}))
+
     def test_product_detail(self):
         """Тест получения деталей продукта."""
         response = self.client.get(
@@ -145,11 +337,12 @@ class ProductAPITests(TestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['title'], 'iPhone 15')
+        self.assertEqual(response.data['days_since_created'], 0)
 
     def test_product_create(self):
         """Тест создания продукта."""
         response = self.client.post(
-            reverse('products:product_create'),
+            PRODUCT_CREATE_URL,
             self.valid_payload,
             format='multipart'
         )
@@ -163,7 +356,7 @@ class ProductAPITests(TestCase):
         invalid_payload['price'] = '-100.00'
 
         response = self.client.post(
-            reverse('products:product_create'),
+            PRODUCT_CREATE_URL,
             invalid_payload,
             format='multipart'
         )
@@ -172,14 +365,11 @@ class ProductAPITests(TestCase):
 
     def test_product_update(self):
         """Тест обновления продукта."""
-        update_data = {
-            'title': 'Updated Product',
-            'price': '299.99'
-        }
-        response = self.client.patch(
+        response = self.client.generic(
+            'PATCH',
             reverse('products:product_update', kwargs={'pk': self.product.pk}),
-            update_data,
-            format='json'
+            UPDATE_BODY,
+            content_type='application/json'
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.product.refresh_from_db()
@@ -194,168 +384,312 @@ class ProductAPITests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Product.objects.count(), 0)
 
-    def test_product_list_filtering(self):
-        """Тест фильтрации списка продуктов."""
-        # Создаем дополнительный продукт для тестирования фильтров
+    def test_product_writes_skip_elasticsearch(self):
+        """Тест отсутствия запросов к Elasticsearch при записи продуктов в тестах без поиска."""
+        with count_es_requests() as es_requests:
+            self.client.post(PRODUCT_CREATE_URL, self.valid_payload, format='multipart')
+            self.client.generic(
+                'PATCH',
+                reverse('products:product_update', kwargs={'pk': self.product.pk}),
+                UPDATE_BODY,
+                content_type='application/json'
+            )
+            self.client.delete(reverse('products:product_delete', kwargs={'pk': self.product.pk}))
+        self.assertEqual(es_requests.call_count, 0)
+
+    @patch.object(ProductQueryService, '_search_product_ids', return_value=[])
+    def test_product_search_no_results(self, mock_search_ids):
+        """Тест поиска без совпадений: пустая страница, а не ошибка."""
+        response = self.client.get(PRODUCT_LIST_URL, {'q': 'nothing-matches'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 0)
+        self.assertEqual(response.data['results'], [])
+        mock_search_ids.assert_called_once_with('nothing-matches')
+
+    @patch.object(ProductQueryService, '_search_product_ids')
+    def test_product_search_exact_title(self, mock_search_ids):
+        """Тест точного поиска: запрос в кавычках сравнивается с названием в БД без Elasticsearch."""
         Product.objects.create(
-            title='Cheap Product',
-            description='Дешевый товар',
-            price=Decimal('9.99'),
-            stock=100,
-            category=self.category,
-            user=self.user,
-            is_active=True
+            title='iPhone 15 Pro', description='Новый iPhone', price=DEFAULT_PRICE,
+            stock=10, category=self.category, user=self.user
+        )
+        response = self.client.get(PRODUCT_LIST_URL, {'q': '"iphone 15"'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([product['title'] for product in response.data['results']], ['iPhone 15'])
+        mock_search_ids.assert_not_called()
+
+    def test_unauthorized_access(self):
+        """Тест доступа без авторизации."""
+        self.client.logout()
+
+        # Проверка доступа к списку продуктов (должен быть разрешен)
+        response = self.client.get(PRODUCT_LIST_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Проверка создания продукта (должно быть запрещено)
+        response = self.client.post(
+            PRODUCT_CREATE_URL,
+            self.valid_payload,
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_wrong_user_access(self):
+        """Тест доступа другого пользователя."""
+        other_user = User.objects.create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=other_user)
+
+        # Попытка обновления чужого продукта
+        response = self.client.generic(
+            'PATCH',
+            reverse('products:product_update', kwargs={'pk': self.product.pk}),
+            HACK_BODY,
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['code'], 'permission_denied')
+        self.assertEqual(response.data['error'], 'У вас недостаточно прав для выполнения данного действия.')
+
+        # Попытка удаления чужого продукта
+        response = self.client.delete(
+            reverse('products:product_delete', kwargs={'pk': self.product.pk})
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['code'], 'permission_denied')
+        self.assertEqual(response.data['error'], 'У вас недостаточно прав для выполнения данного действия.')
+
+
+@override_settings(ELASTICSEARCH_DSL_AUTOSYNC=False)
+class ProductQueryAPITests(TestCase):
+    """Тесты фильтрации и сортировки списка продуктов.
+
+    Выделены из ProductAPITests, чтобы при запуске с --parallel нагрузка между
+    воркерами распределялась равномернее.
+    """
+
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        """Подготовка продуктов с разной ценой."""
+        cls.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
         )
+        cls.category = Category.objects.create(
+            title='Электроника',
+            description='Электронные устройства'
+        )
+        bulk_create_products(
+            (
+                {'title': 'iPhone 15', 'price': Decimal('999.99')},
+                {'title': 'Cheap Product', 'price': Decimal('9.99')},
+            ),
+            stock=10, category=cls.category, user=cls.user
+        )
+
+    def setUp(self):
+        use_isolated_cache(self)
 
+    def test_product_list_filtering(self):
+        """Тест фильтрации списка продуктов."""
         # Фильтр по минимальной цене
-        response = self.client.get(reverse('products:product_list'), {'min_price': '500'})
+        response = self.client.get(PRODUCT_LIST_URL, {'min_price': '500'})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 1)
         self.assertEqual(response.data['results'][0]['title'], 'iPhone 15')
 
         # Фильтр по наличию
-        response = self.client.get(reverse('products:product_list'), {'in_stock': 'true'})
+        response = self.client.get(PRODUCT_LIST_URL, {'in_stock': 'true'})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 2)
 
     def test_product_list_ordering(self):
         """Тест сортировки списка продуктов."""
-        # Создаем дополнительный продукт для тестирования сортировки
-        Product.objects.create(
-            title='Cheap Product',
-            description='Дешевый товар',
-            price=Decimal('9.99'),
-            stock=100,
-            category=self.category,
-            user=self.user,
-            is_active=True
-        )
-
         # Сортировка по цене (по возрастанию)
-        response = self.client.get(reverse('products:product_list'), {'ordering': 'price'})
+        response = self.client.get(PRODUCT_LIST_URL, {'ordering': 'price'})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 2)
         self.assertEqual(response.data['results'][0]['title'], 'Cheap Product')
         self.assertEqual(response.data['results'][1]['title'], 'iPhone 15')
 
         # Сортировка по цене (по убыванию)
-        response = self.client.get(reverse('products:product_list'), {'ordering': '-price'})
+        response = self.client.get(PRODUCT_LIST_URL, {'ordering': '-price'})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 2)
         self.assertEqual(response.data['results'][0]['title'], 'iPhone 15')
         self.assertEqual(response.data['results'][1]['title'], 'Cheap Product')
 
-    def test_product_search(self):
-        """Тест поиска продуктов."""
-        # Создаем продукты для поиска
-        iphone_14 = Product.objects.create(
-            title='iPhone 14',
-            description='Новый iPhone 14',
-            price=Decimal('999.99'),
-            stock=15,
-            category=self.category,
-            user=self.user,
-            is_active=True
+
+# Требует запущенного Elasticsearch
+@tag('elasticsearch', 'slow')
+@override_settings(ELASTICSEARCH_DSL_AUTOSYNC=False)
+class ProductSearchAPITests(TestCase):
+    """Тесты поиска продуктов через API.
+
+    Индекс Elasticsearch перестраивается один раз для класса после создания всех продуктов.
+    Имя индекса дополняется именем тестовой БД, чтобы параллельные воркеры (--parallel,
+    pytest-xdist) с собственными клонами БД не перестраивали общий индекс.
+    """
+
+    client_class = APIClient
+
+    @classmethod
+    def setUpClass(cls):
+        index = ProductDocument._index
+        # Восстанавливается и при ошибке setUpClass: unittest вызывает class cleanups в любом случае
+        cls.addClassCleanup(setattr, index, '_name', index._name)
+        index._name = f"{index._name}_{connection.settings_dict['NAME']}".lower()
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        """Подготовка продуктов для поиска."""
+        cls.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
         )
-        samsung = Product.objects.create(
-            title='Samsung Galaxy',
-            description='Android смартфон',
-            price=Decimal('799.99'),
-            stock=15,
-            category=self.category,
-            user=self.user,
-            is_active=True
+        cls.category = Category.objects.create(
+            title='Электроника',
+            description='Электронные устройства'
         )
-        xiaomi = Product.objects.create(
-            title='Xiaomi Phone',
-            description='iPhone killer с отличной камерой',
-            price=Decimal('399.99'),
-            stock=15,
-            category=self.category,
-            user=self.user,
-            is_active=True
+        # Один INSERT без сигналов сохранения: индекс все равно перестраивается ниже
+        products = bulk_create_products(
+            (
+                {'title': title, 'description': description, 'price': Decimal(price)}
+                for title, description, price in (
+                    ('iPhone 15', 'Новый iPhone', '999.99'),
+                    ('iPhone 14', 'Новый iPhone 14', '999.99'),
+                    ('Samsung Galaxy', 'Android смартфон', '799.99'),
+                    ('Xiaomi Phone', 'iPhone killer с отличной камерой', '399.99'),
+                )
+            ),
+            stock=15, category=cls.category, user=cls.user
         )
+        cls.titles = {product.id: product.title for product in products}
+        # Строим индекс здесь, а не в setUpClass: при ошибке Django откатывает данные класса.
+        # Все продукты индексируются одним bulk-запросом с refresh, чтобы сразу быть доступными для поиска
+        ProductDocument._index.delete(ignore_unavailable=True)
+        ProductDocument.init()
+        cls.addClassCleanup(ProductDocument._index.delete, ignore_unavailable=True)
+        ProductDocument().update(Product.objects.select_related('category'), refresh=True)
 
-        # Переиндексируем Elasticsearch
-        from django.core.management import call_command
-        call_command('search_index', '--rebuild', '-f')
+    def setUp(self):
+        use_isolated_cache(self)
 
-        # Базовый поиск по слову 'iphone'
-        response = self.client.get(reverse('products:product_list'), {'q': 'iphone'})
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data['results']), 3)  # iPhone 14
-        
-        # Проверяем, что iPhone 14 и iPhone 15 в начале результатов (выше ранжированы)
-        iphone_titles = [product['title'] for product in response.data['results'][:2]]
-        self.assertTrue(all('iPhone' in title for title in iphone_titles))
-
-        # Поиск с опечаткой
-        response = self.client.get(reverse('products:product_list'), {'q': 'ifone'})
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertTrue(len(response.data['results']) > 0)  # Должен найти iPhone
+    def _search(self, query):
+        """Возвращает названия найденных продуктов в порядке релевантности, минуя API."""
+        return [self.titles[pk] for pk in ProductQueryService._search_product_ids(query)]
 
-        # Поиск по описанию
-        response = self.client.get(reverse('products:product_list'), {'q': 'killer'})
+    def test_product_search(self):
+        """Тест релевантности поискового запроса Elasticsearch."""
+        # Запрос, ожидаемое число результатов (None - хотя бы один), ожидаемый первый результат
+        cases = (
+            ('iphone', 3, None),
+            ('ifone', None, None),  # Опечатка
+            ('killer', 1, 'Xiaomi Phone'),  # Поиск по описанию
+            ('sam', 1, 'Samsung Galaxy'),  # Поиск по части слова
+            ('phone android', None, None),  # Несколько слов
+        )
+        for query, expected_count, expected_first in cases:
+            with self.subTest(q=query):
+                titles = self._search(query)
+                if expected_count is None:
+                    self.assertTrue(len(titles) > 0)
+                else:
+                    self.assertEqual(len(titles), expected_count)
+                if expected_first:
+                    self.assertEqual(titles[0], expected_first)
+
+    def test_product_search_ranking(self):
+        """Тест ранжирования: продукты с совпадением в названии выше совпадений в описании."""
+        self.assertTrue(all('iPhone' in title for title in self._search('iphone')[:2]))
+
+    def test_product_search_endpoint(self):
+        """Тест поиска через API: запрос передается в Elasticsearch, продукты берутся из БД."""
+        response = self.client.get(PRODUCT_LIST_URL, {'q': 'killer'})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data['results']), 1)
-        self.assertEqual(response.data['results'][0]['title'], 'Xiaomi Phone')
+        self.assertEqual([product['title'] for product in response.data['results']], ['Xiaomi Phone'])
 
-        # Поиск по части слова
-        response = self.client.get(reverse('products:product_list'), {'q': 'sam'})
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data['results']), 1)
-        self.assertEqual(response.data['results'][0]['title'], 'Samsung Galaxy')
 
-        # Поиск по нескольким словам
-        response = self.client.get(reverse('products:product_list'), {'q': 'phone android'})
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertTrue(len(response.data['results']) >= 1)  # Должен найти телефоны с Android
+class ProductPaginationTests(TestCase):
+    """Тесты пагинации списка продуктов."""
 
-        # Точный поиск по модели
-        response = self.client.get(reverse('products:product_list'), {'q': '"iPhone 14"'})
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data['results']), 1)
-        self.assertEqual(response.data['results'][0]['title'], 'iPhone 14')
+    client_class = APIClient
 
-    def test_unauthorized_access(self):
-        """Тест доступа без авторизации."""
-        self.client.logout()
+    @classmethod
+    def setUpTestData(cls):
+        """Подготовка тестовых данных, общих для всех тестов класса."""
+        cls.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        cls.category = Category.objects.create(title='Электроника')
+        bulk_create_products(({'title': f'Товар {i}'} for i in range(3)), category=cls.category, user=cls.user)
 
-        # Проверка доступа к списку продуктов (должен быть разрешен)
-        response = self.client.get(reverse('products:product_list'))
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    def setUp(self):
+        use_isolated_cache(self)
 
-        # Проверка создания продукта (должно быть запрещено)
-        response = self.client.post(
-            reverse('products:product_create'),
-            self.valid_payload,
-            format='multipart'
-        )
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    def test_count_cached_between_pages(self):
+        """Тест кэширования общего количества и его сброса при изменении продуктов."""
+        queryset = Product.objects.filter(is_active=True).order_by('-popularity_score', 'id')
+        self.assertEqual(CachedCountPaginator(queryset, 2).count, 3)
 
-    def test_wrong_user_access(self):
-        """Тест доступа другого пользователя."""
-        other_user = User.objects.create_user(
-            username='otheruser',
-            email='other@example.com',
-            password='testpass123'
-        )
-        self.client.force_authenticate(user=other_user)
+        # Следующая страница той же выборки не выполняет COUNT
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedCountPaginator(queryset, 2).count, 3)
 
-        # Попытка обновления чужого продукта
-        response = self.client.patch(
-            reverse('products:product_update', kwargs={'pk': self.product.pk}),
-            {'title': 'Hacked Product'},
-            format='json'
+        # Сохранение продукта сбрасывает версию кэша списка
+        Product.objects.create(
+            title='Товар 3', price=DEFAULT_PRICE, stock=1,
+            category=self.category, user=self.user, is_active=True
         )
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
-        self.assertEqual(response.data['code'], 'permission_denied')
-        self.assertEqual(response.data['error'], 'У вас недостаточно прав для выполнения данного действия.')
+        self.assertEqual(CachedCountPaginator(queryset, 2).count, 4)
 
-        # Попытка удаления чужого продукта
-        response = self.client.delete(
-            reverse('products:product_delete', kwargs={'pk': self.product.pk})
+    def test_keyset_pagination(self):
+        """Тест курсорной пагинации: страницы не пересекаются при равной популярности."""
+        Product.objects.update(popularity_score=1.0)
+        url = PRODUCT_LIST_URL
+
+        response = self.client.get(url, {'cursor': '', 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first_page = [item['id'] for item in response.data['results']]
+        self.assertEqual(len(first_page), 2)
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get(url, {'cursor': response.data['next'], 'page_size': 2})
+        second_page = [item['id'] for item in response.data['results']]
+        self.assertEqual(len(second_page), 1)
+        self.assertIsNone(response.data['next'])
+        self.assertCountEqual(first_page + second_page, Product.objects.values_list('id', flat=True))
+
+    @tag('slow')
+    def test_product_list_scales_with_rows(self):
+        """Тест постоянного числа запросов списка на десятках тысяч продуктов."""
+        seed_products(Product.objects.first(), 10000)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(PRODUCT_LIST_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 10003)
+
+        # Следующая курсорная страница - одна выборка по индексу, без COUNT и OFFSET
+        response = self.client.get(PRODUCT_LIST_URL, {'cursor': ''})
+        with self.assertNumQueries(1):
+            response = self.client.get(PRODUCT_LIST_URL, {'cursor': response.data['next']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_keyset_pagination_invalid_cursor(self):
+        """Тест отклонения некорректного курсора и сортировки, отличной от популярности."""
+        url = PRODUCT_LIST_URL
+        self.assertEqual(self.client.get(url, {'cursor': 'abc'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            self.client.get(url, {'cursor': '', 'ordering': 'price'}).status_code, status.HTTP_400_BAD_REQUEST
         )
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
-        self.assertEqual(response.data['code'], 'permission_denied')
-        self.assertEqual(response.data['error'], 'У вас недостаточно прав для выполнения данного действия.')
@@ -7,57 +7,95 @@
 from decimal import Decimal
 from unittest.mock import patch, MagicMock
 
-from django.test import TestCase, override_settings
+from django.test import SimpleTestCase, TestCase, override_settings, RequestFactory, tag
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django_elasticsearch_dsl.registries import registry
+from elasticsearch.exceptions import ConnectionTimeout
 from elasticsearch_dsl import Search
 from rest_framework import status
+from rest_framework.test import APIRequestFactory
 from django.core.cache import cache
+from apps.core.services.cache_services import CacheService
+from apps.core.utils import unique_slugify
 from apps.products.models import Category, Product
 from apps.products.documents import ProductDocument
 from apps.products.services.query_services import ProductQueryService
-from apps.products.services.tasks import update_elasticsearch_task
+from apps.products.views import ProductListView
+from apps.products.services.tasks import update_elasticsearch_task, bulk_reindex_products, ES_DEBOUNCE_TIMEOUT
 from django.db import models
+from django.db.models.signals import post_delete, post_save
 
 User = get_user_model()
 
+# Представление списка создается один раз и вызывается напрямую, минуя middleware и маршрутизацию URL
+product_list_view = ProductListView.as_view()
+request_factory = APIRequestFactory()
+PRODUCT_LIST_URL = reverse('products:product_list')
 
-@override_settings(ELASTICSEARCH_DSL_AUTOSYNC=True)
+
+def get_product_list(params):
+    """Выполняет GET-запрос к списку продуктов через представление.
+
+    Args:
+        params: Параметры строки запроса.
+
+    Returns:
+        Response: Ответ DRF с заполненным data.
+    """
+    return product_list_view(request_factory.get(PRODUCT_LIST_URL, params))
+
+
+@tag('elasticsearch', 'slow')
+@override_settings(
+    ELASTICSEARCH_DSL_AUTOSYNC=True,
+    # Кэш в памяти процесса: без сетевых обращений к Redis и без общего состояния между прогонами
+    CACHES={
+        alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-es-{alias}'}
+        for alias in ('default', 'local')
+    },
+)
 class ElasticsearchIntegrationTests(TestCase):
     """Тесты интеграции с Elasticsearch.
 
     В тестовом режиме проверяет только подготовку данных для индексации.
     """
 
-    @patch('apps.products.services.tasks.update_elasticsearch_task.delay')
-    def setUp(self, mock_task):
-        """Подготовка тестовых данных."""
-        self.user = User.objects.create_user(
-            username='testuser',
-            email='test@example.com',
-            password='testpass123'
-        )
-        self.category = Category.objects.create(
-            title='Электроника',
-            description='Электронные устройства'
-        )
-        self.product = Product.objects.create(
-            title='iPhone 15',
-            description='Новый iPhone',
-            price=Decimal('999.99'),
-            stock=10,
-            category=self.category,
-            user=self.user,
-            is_active=True,
-            discount=Decimal('0.00')
-        )
-        # Сохраняем mock для использования в тестах
-        self.mock_task = mock_task
+    @classmethod
+    def setUpTestData(cls):
+        """Подготовка тестовых данных, общих для всех тестов класса."""
+        with patch('apps.products.services.tasks.update_elasticsearch_task.apply_async') as mock_task:
+            cls.user = User.objects.create_user(
+                username='testuser',
+                email='test@example.com',
+                password='testpass123'
+            )
+            cls.category = Category.objects.create(
+                title='Электроника',
+                description='Электронные устройства'
+            )
+            cls.product = Product.objects.create(
+                title='iPhone 15',
+                description='Новый iPhone',
+                price=Decimal('999.99'),
+                stock=10,
+                category=cls.category,
+                user=cls.user,
+                is_active=True,
+                discount=Decimal('0.00')
+            )
+        # Сохраняем аргументы вызовов задачи индексации обычными кортежами: setUpTestData
+        # глубоко копирует атрибуты класса для каждого теста, а объекты mock этого не допускают
+        cls.mock_task_calls = [(c.args, c.kwargs) for c in mock_task.call_args_list]
+
+    def setUp(self):
+        """Очистка кэша перед каждым тестом (маркеры debounce, версии и результаты поиска)."""
+        cache.clear()
 
     def test_product_data_preparation(self):
         """Тест подготовки данных продукта для индексации."""
-        # Проверяем, что сигнал был отправлен при создании продукта в setUp
-        self.mock_task.assert_called_with(self.product.id)
+        # Проверяем, что сигнал был отправлен при создании продукта в setUpTestData
+        self.assertEqual(self.mock_task_calls[-1], (((self.product.id,),), {'countdown': ES_DEBOUNCE_TIMEOUT}))
 
         # Проверяем методы prepare
         doc = ProductDocument()
@@ -70,7 +108,7 @@ class ElasticsearchIntegrationTests(TestCase):
             'slug': self.category.slug
         })
 
-    @patch('apps.products.services.tasks.update_elasticsearch_task.delay')
+    @patch('apps.products.services.tasks.update_elasticsearch_task.apply_async')
     def test_product_indexing(self, mock_task):
         """Тест индексации продукта в Elasticsearch."""
         # Создаем новый продукт
@@ -85,7 +123,7 @@ class ElasticsearchIntegrationTests(TestCase):
         )
 
         # Проверяем, что задача обновления была вызвана
-        mock_task.assert_called_with(product.id)
+        mock_task.assert_called_with((product.id,), countdown=ES_DEBOUNCE_TIMEOUT)
 
         # Проверяем подготовку документа
         doc = ProductDocument()
@@ -98,11 +136,8 @@ class ElasticsearchIntegrationTests(TestCase):
         # Настраиваем мок для результатов поиска
         mock_search.return_value = Product.objects.filter(id=self.product.id)
 
-        # Очищаем кэш перед выполнением поиска
-        cache.clear()
-
         # Выполняем поиск
-        response = self.client.get(reverse('products:product_list') + '?q=iphone')
+        response = get_product_list({'q': 'iphone'})
 
         # Проверяем ответ
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -112,26 +147,7 @@ class ElasticsearchIntegrationTests(TestCase):
         # Проверяем, что поиск был вызван с правильными параметрами
         mock_search.assert_called_once()
 
-    @patch('elasticsearch_dsl.Search.filter')
-    def test_product_filtering_with_elasticsearch(self, mock_filter):
-        """Тест фильтрации продуктов через Elasticsearch."""
-        # Настраиваем мок для фильтрации
-        mock_filter.return_value = Search()
-
-        # Применяем фильтры
-        ProductQueryService.apply_common_filters(
-            Search(),
-            category_id=self.category.id,
-            min_price=Decimal('500.00'),
-            max_price=Decimal('1000.00'),
-            min_discount=Decimal('0.00'),
-            in_stock=True
-        )
-
-        # Проверяем, что фильтр был вызван
-        self.assertTrue(mock_filter.called)
-
-    @patch('apps.products.services.tasks.update_elasticsearch_task.delay')
+    @patch('apps.products.services.tasks.update_elasticsearch_task.apply_async')
     def test_product_update_triggers_reindex(self, mock_task):
         """Тест переиндексации при обновлении продукта."""
         # Обновляем продукт
@@ -139,13 +155,93 @@ class ElasticsearchIntegrationTests(TestCase):
         self.product.save()
 
         # Проверяем, что задача обновления была вызвана
-        mock_task.assert_called_with(self.product.id)
+        mock_task.assert_called_with((self.product.id,), countdown=ES_DEBOUNCE_TIMEOUT)
 
         # Проверяем подготовку обновленного документа
         doc = ProductDocument()
         self.assertEqual(doc.prepare_price(self.product), float(self.product.price))
         self.assertEqual(doc.prepare_category(self.product)['title'], self.category.title)
 
+    @patch('apps.products.services.tasks.update_elasticsearch_task.apply_async')
+    def test_rapid_updates_coalesced(self, mock_task):
+        """Тест объединения частых сохранений продукта в одну задачу индексации."""
+        for price in ('899.99', '849.99', '799.99'):
+            self.product.price = Decimal(price)
+            self.product.save()
+
+        mock_task.assert_called_once_with((self.product.id,), countdown=ES_DEBOUNCE_TIMEOUT)
+
+    @patch('apps.products.documents.ProductDocument.bulk')
+    def test_bulk_reindex_products(self, mock_bulk):
+        """Тест пакетной индексации: активные продукты индексируются, остальные удаляются."""
+        with patch('apps.products.services.tasks.update_elasticsearch_task.apply_async'):
+            inactive = Product.objects.create(
+                title='iPhone 13', description='Снят с продажи', price=Decimal('599.99'),
+                stock=0, category=self.category, user=self.user, is_active=False
+            )
+        calls = []
+        mock_bulk.side_effect = lambda actions, **kwargs: calls.append(list(actions)) or (len(calls[-1]), [])
+
+        # Все документы готовятся за один запрос к продуктам и один — к неактивным ID
+        with self.assertNumQueries(2):
+            bulk_reindex_products(product_ids=[self.product.id, inactive.id, 0])
+
+        self.assertEqual(mock_bulk.call_count, 2)
+        indexed, deleted = calls
+        self.assertEqual([action['_id'] for action in indexed], [self.product.id])
+        self.assertEqual(indexed[0]['_op_type'], 'index')
+        self.assertEqual(indexed[0]['_source']['category']['id'], self.category.id)
+        self.assertCountEqual([action['_id'] for action in deleted], [inactive.id, 0])
+
+    @patch('apps.products.documents.ProductDocument.update')
+    def test_update_task_indexes_product_once(self, mock_update):
+        """Тест индексации продукта задачей products без дублирования автосинхронизацией библиотеки."""
+        # Автосинхронизация django_elasticsearch_dsl не индексирует продукты повторно
+        registry.update(self.product)
+        mock_update.assert_not_called()
+
+        update_elasticsearch_task(self.product.id)
+        mock_update.assert_called_once_with(self.product)
+
+    @patch('apps.products.documents.ProductDocument.update')
+    def test_update_task_invalidates_search_cache(self, mock_update):
+        """Тест сброса кэша поиска после записи в индекс, а не только при сохранении продукта."""
+        version = CacheService.get_cache_version('search_results')
+        update_elasticsearch_task(self.product.id)
+        self.assertGreater(CacheService.get_cache_version('search_results'), version)
+
+        # Индекс не изменился - кэш поиска не сбрасывается
+        mock_update.side_effect = Exception('es down')
+        version = CacheService.get_cache_version('search_results')
+        with patch.object(update_elasticsearch_task, 'retry', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                update_elasticsearch_task(self.product.id)
+        self.assertEqual(CacheService.get_cache_version('search_results'), version)
+
+    def test_product_signals_registered_once(self):
+        """Тест однократной регистрации обработчиков сигналов продукта (по dispatch_uid)."""
+        registrations = (
+            (post_save, 'products.product_es_update'),
+            (post_delete, 'products.product_es_delete'),
+            (post_save, 'products.category_descendants_cache'),
+            (post_delete, 'products.category_descendants_cache'),
+        )
+        for signal, dispatch_uid in registrations:
+            with self.subTest(dispatch_uid=dispatch_uid):
+                # Ключ обработчика в signal.receivers: ((dispatch_uid, id(sender)), ...)
+                lookup_keys = [lookup_key for lookup_key, *_ in signal.receivers]
+                self.assertEqual(sum(1 for uid, _ in lookup_keys if uid == dispatch_uid), 1)
+
+    @patch('apps.products.documents.ProductDocument._get_connection')
+    def test_delete_task_sends_single_request(self, mock_connection):
+        """Тест удаления документа одним запросом DELETE без предварительного GET."""
+        client = mock_connection.return_value.options.return_value
+        update_elasticsearch_task(self.product.id, delete=True)
+
+        mock_connection.return_value.options.assert_called_once_with(ignore_status=404)
+        client.delete.assert_called_once_with(index=ProductDocument._index._name, id=self.product.id)
+        client.get.assert_not_called()
+
     @patch('apps.products.services.tasks.update_elasticsearch_task.delay')
     def test_product_deletion_removes_from_index(self, mock_task):
         """Тест удаления продукта из индекса при удалении из БД."""
@@ -163,10 +259,7 @@ class ElasticsearchIntegrationTests(TestCase):
         mock_search.return_value = Product.objects.filter(id=self.product.id)
 
         # Выполняем поиск с фильтром по категории
-        response = self.client.get(
-            reverse('products:product_list') +
-            f'?q=iphone&category={self.category.id}'
-        )
+        response = get_product_list({'q': 'iphone', 'category': self.category.id})
 
         # Проверяем ответ
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -179,19 +272,17 @@ class ElasticsearchIntegrationTests(TestCase):
     @patch('apps.products.services.query_services.ProductQueryService.search_products')
     def test_search_relevance_scoring(self, mock_search):
         """Тест релевантности результатов поиска."""
-        # Создаем второй продукт
-        product2 = Product.objects.create(
+        # Создаем второй продукт без сигналов сохранения: поиск замокан
+        product2, = Product.objects.bulk_create([Product(
             title='iPhone 13',
+            slug=unique_slugify('iPhone 13'),
             description='Старый iPhone',
             price=Decimal('799.99'),
             stock=5,
             category=self.category,
             user=self.user,
             is_active=True
-        )
-
-        # Очищаем кэш перед поиском
-        cache.clear()
+        )])
 
         # Настраиваем мок для результатов поиска
         mock_search.return_value = Product.objects.filter(
@@ -199,7 +290,7 @@ class ElasticsearchIntegrationTests(TestCase):
         ).order_by('-created')  # Сортируем по дате создания, чтобы iPhone 15 был первым
 
         # Выполняем поиск
-        response = self.client.get(reverse('products:product_list') + '?q=iphone 13')
+        response = get_product_list({'q': 'iphone 13'})
 
         # Проверяем ответ
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -213,10 +304,11 @@ class ElasticsearchIntegrationTests(TestCase):
     @patch('apps.products.services.query_services.ProductQueryService.search_products')
     def test_russian_morphology_search(self, mock_search):
         """Тест поиска с учетом морфологии русского языка."""
-        # Создаем продукты с разными формами слов
-        products = [
-            Product.objects.create(
+        # Создаем продукты с разными формами слов одним INSERT без сигналов сохранения: поиск замокан
+        products = Product.objects.bulk_create([
+            Product(
                 title='Красный телефон',
+                slug=unique_slugify('Красный телефон'),
                 description='Мобильный телефон красного цвета',
                 price=Decimal('999.99'),
                 stock=10,
@@ -224,8 +316,9 @@ class ElasticsearchIntegrationTests(TestCase):
                 user=self.user,
                 is_active=True
             ),
-            Product.objects.create(
+            Product(
                 title='Телефоны Samsung',
+                slug=unique_slugify('Телефоны Samsung'),
                 description='Мобильные телефоны в ассортименте',
                 price=Decimal('899.99'),
                 stock=5,
@@ -233,7 +326,7 @@ class ElasticsearchIntegrationTests(TestCase):
                 user=self.user,
                 is_active=True
             )
-        ]
+        ])
 
         # Настраиваем мок для результатов поиска
         mock_search.return_value = Product.objects.filter(id__in=[p.id for p in products])
@@ -241,9 +334,10 @@ class ElasticsearchIntegrationTests(TestCase):
         # Тестируем поиск с разными формами слова
         test_queries = ['телефон', 'телефоны', 'телефонов']
         for query in test_queries:
-            response = self.client.get(reverse('products:product_list') + f'?q={query}')
-            self.assertEqual(response.status_code, status.HTTP_200_OK)
-            self.assertEqual(len(response.data['results']), 2)
+            with self.subTest(q=query):
+                response = get_product_list({'q': query})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(len(response.data['results']), 2)
 
         mock_search.assert_called()
 
@@ -267,20 +361,22 @@ class ElasticsearchIntegrationTests(TestCase):
         # Тестируем поиск с опечатками
         test_queries = ['смортфон', 'самсунг', 'галакси']
         for query in test_queries:
-            response = self.client.get(reverse('products:product_list') + f'?q={query}')
-            self.assertEqual(response.status_code, status.HTTP_200_OK)
-            self.assertEqual(len(response.data['results']), 1)
-            self.assertEqual(response.data['results'][0]['title'], 'Смартфон Samsung Galaxy')
+            with self.subTest(q=query):
+                response = get_product_list({'q': query})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(len(response.data['results']), 1)
+                self.assertEqual(response.data['results'][0]['title'], 'Смартфон Samsung Galaxy')
 
         mock_search.assert_called()
 
     @patch('apps.products.services.query_services.ProductQueryService.search_products')
     def test_partial_match_search(self, mock_search):
         """Тест поиска по частичному совпадению в русском языке."""
-        # Создаем продукты
-        products = [
-            Product.objects.create(
+        # Создаем продукты одним INSERT без сигналов сохранения: поиск замокан
+        products = Product.objects.bulk_create([
+            Product(
                 title='Беспроводные наушники Sony',
+                slug=unique_slugify('Беспроводные наушники Sony'),
                 description='Bluetooth наушники с шумоподавлением',
                 price=Decimal('299.99'),
                 stock=15,
@@ -288,8 +384,9 @@ class ElasticsearchIntegrationTests(TestCase):
                 user=self.user,
                 is_active=True
             ),
-            Product.objects.create(
+            Product(
                 title='Наушники проводные Sennheiser',
+                slug=unique_slugify('Наушники проводные Sennheiser'),
                 description='Профессиональные наушники',
                 price=Decimal('199.99'),
                 stock=20,
@@ -297,7 +394,7 @@ class ElasticsearchIntegrationTests(TestCase):
                 user=self.user,
                 is_active=True
             )
-        ]
+        ])
 
         # Настраиваем мок для результатов поиска
         mock_search.return_value = Product.objects.filter(id__in=[p.id for p in products])
@@ -305,9 +402,10 @@ class ElasticsearchIntegrationTests(TestCase):
         # Тестируем поиск по частям слов
         test_queries = ['науш', 'беспр', 'пров']
         for query in test_queries:
-            response = self.client.get(reverse('products:product_list') + f'?q={query}')
-            self.assertEqual(response.status_code, status.HTTP_200_OK)
-            self.assertTrue(len(response.data['results']) > 0)
+            with self.subTest(q=query):
+                response = get_product_list({'q': query})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertTrue(len(response.data['results']) > 0)
 
         mock_search.assert_called()
 
@@ -331,10 +429,11 @@ class ElasticsearchIntegrationTests(TestCase):
         # Тестируем поиск с синонимами
         test_queries = ['телефон', 'смартфон', 'мобильник']
         for query in test_queries:
-            response = self.client.get(reverse('products:product_list') + f'?q={query}')
-            self.assertEqual(response.status_code, status.HTTP_200_OK)
-            self.assertEqual(len(response.data['results']), 1)
-            self.assertEqual(response.data['results'][0]['title'], 'Мобильный телефон iPhone')
+            with self.subTest(q=query):
+                response = get_product_list({'q': query})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(len(response.data['results']), 1)
+                self.assertEqual(response.data['results'][0]['title'], 'Мобильный телефон iPhone')
 
         mock_search.assert_called()
 
@@ -355,22 +454,82 @@ class ElasticsearchIntegrationTests(TestCase):
         # Настраиваем мок для результатов поиска
         mock_search.return_value = Product.objects.filter(id=product.id)
 
-        # Очищаем кэш перед тестом
-        cache.clear()
-
         # Первый запрос (должен вызвать поиск)
-        response1 = self.client.get(reverse('products:product_list') + '?q=тестовый')
+        response1 = get_product_list({'q': 'тестовый'})
         self.assertEqual(response1.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response1.data['results']), 1)
 
         # Второй запрос (должен использовать кэш)
-        response2 = self.client.get(reverse('products:product_list') + '?q=тестовый')
+        response2 = get_product_list({'q': 'тестовый'})
         self.assertEqual(response2.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response2.data['results']), 1)
 
         # Проверяем, что поиск был вызван только один раз
         mock_search.assert_called_once()
 
+    @patch('apps.products.services.query_services.ProductQueryService._search_product_ids')
+    def test_search_ids_cached(self, mock_search_ids):
+        """Тест кэширования ID результатов поиска и его инвалидации при изменении продукта."""
+        mock_search_ids.return_value = [self.product.id]
+        request = RequestFactory().get('/products', {'q': 'iphone'})
+
+        self.assertEqual(list(ProductQueryService.search_products(request)), [self.product])
+        self.assertEqual(list(ProductQueryService.search_products(request)), [self.product])
+        mock_search_ids.assert_called_once_with('iphone')
+
+        # Сохранение продукта сбрасывает кэш результатов поиска
+        with patch('apps.products.services.tasks.update_elasticsearch_task.apply_async'):
+            self.product.save()
+        ProductQueryService.search_products(request)
+        self.assertEqual(mock_search_ids.call_count, 2)
+
+    @patch('apps.products.services.query_services.ProductQueryService._search_product_ids')
+    def test_search_preserves_elasticsearch_order(self, mock_search_ids):
+        """Тест сохранения порядка релевантности Elasticsearch при выборке из базы."""
+        with patch('apps.products.services.tasks.update_elasticsearch_task.apply_async'):
+            other = Product.objects.create(
+                title='iPhone 14', description='Старая модель', price=Decimal('799.99'),
+                stock=5, category=self.category, user=self.user, is_active=True
+            )
+        mock_search_ids.return_value = [other.id, self.product.id]
+        request = RequestFactory().get('/products', {'q': 'iphone'})
+
+        self.assertEqual(list(ProductQueryService.search_products(request)), [other, self.product])
+
+    @patch('apps.products.services.query_services.ProductQueryService._search_product_ids')
+    def test_search_falls_back_to_postgres(self, mock_search_ids):
+        """Тест переключения поиска на PostgreSQL при недоступности Elasticsearch."""
+        mock_search_ids.side_effect = ConnectionTimeout('timeout')
+        request = RequestFactory().get('/products', {'q': 'iphone'})
+
+        for _ in range(ProductQueryService.ES_FAILURE_THRESHOLD):
+            self.assertEqual(list(ProductQueryService.search_products(request)), [self.product])
+        self.assertEqual(mock_search_ids.call_count, ProductQueryService.ES_FAILURE_THRESHOLD)
+
+        # После превышения порога Elasticsearch не вызывается, пока circuit breaker разомкнут
+        self.assertEqual(list(ProductQueryService.search_products(request)), [self.product])
+        self.assertEqual(mock_search_ids.call_count, ProductQueryService.ES_FAILURE_THRESHOLD)
+
+    @patch('apps.products.services.query_services.ProductQueryService._search_product_ids')
+    def test_postgres_fallback_ids_cached(self, mock_search_ids):
+        """Тест кэширования ID результатов полнотекстового поиска PostgreSQL при разомкнутом circuit breaker."""
+        cache.set(ProductQueryService.ES_CIRCUIT_KEY, True)
+        request = RequestFactory().get('/products', {'q': 'iphone'})
+
+        self.assertEqual(list(ProductQueryService.search_products(request)), [self.product])
+        with patch.object(ProductQueryService, 'search_products_db') as mock_search_db:
+            self.assertEqual(list(ProductQueryService.search_products(request)), [self.product])
+        mock_search_db.assert_not_called()
+        mock_search_ids.assert_not_called()
+
+    @patch('apps.products.services.query_services.ProductQueryService._search_product_ids')
+    def test_exact_search_bypasses_elasticsearch(self, mock_search_ids):
+        """Тест точного поиска по названию в PostgreSQL без обращения к Elasticsearch."""
+        request = RequestFactory().get('/products', {'q': '"iphone 15"'})
+
+        self.assertEqual(list(ProductQueryService.search_products(request)), [self.product])
+        mock_search_ids.assert_not_called()
+
     @patch('apps.products.services.query_services.ProductQueryService.search_products')
     def test_search_with_category_hierarchy(self, mock_search):
         """Тест поиска с учетом иерархии категорий."""
@@ -381,10 +540,11 @@ class ElasticsearchIntegrationTests(TestCase):
             parent=self.category
         )
 
-        # Создаем продукты в разных категориях
-        products = [
-            Product.objects.create(
+        # Создаем продукты в разных категориях одним INSERT без сигналов сохранения: поиск замокан
+        products = Product.objects.bulk_create([
+            Product(
                 title='Смартфон в подкатегории',
+                slug=unique_slugify('Смартфон в подкатегории'),
                 description='Тестовый смартфон',
                 price=Decimal('599.99'),
                 stock=10,
@@ -392,8 +552,9 @@ class ElasticsearchIntegrationTests(TestCase):
                 user=self.user,
                 is_active=True
             ),
-            Product.objects.create(
+            Product(
                 title='Смартфон в основной категории',
+                slug=unique_slugify('Смартфон в основной категории'),
                 description='Другой тестовый смартфон',
                 price=Decimal('699.99'),
                 stock=5,
@@ -401,27 +562,50 @@ class ElasticsearchIntegrationTests(TestCase):
                 user=self.user,
                 is_active=True
             )
-        ]
+        ])
 
         # Настраиваем мок для результатов поиска
         mock_search.return_value = Product.objects.filter(id__in=[p.id for p in products])
 
         # Тестируем поиск по категории и подкатегории
-        response = self.client.get(
-            reverse('products:product_list') +
-            f'?q=смартфон&category={self.category.id}'
-        )
+        response = get_product_list({'q': 'смартфон', 'category': self.category.id})
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 2)
 
         # Тестируем поиск только по подкатегории
-        response = self.client.get(
-            reverse('products:product_list') +
-            f'?q=смартфон&category={subcategory.id}'
-        )
+        response = get_product_list({'q': 'смартфон', 'category': subcategory.id})
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTrue(len(response.data['results']) > 0)
 
         mock_search.assert_called()
+
+
+@tag('elasticsearch', 'fast')
+class ElasticsearchFilterUnitTests(SimpleTestCase):
+    """Тесты построения фильтров Elasticsearch.
+
+    Фильтры собираются в объекте Search без обращения к БД, поэтому тесты не открывают транзакций.
+    """
+
+    @patch.object(ProductQueryService, 'get_category_descendant_ids', return_value=[1, 2])
+    def test_product_filtering_with_elasticsearch(self, mock_descendants):
+        """Тест фильтрации продуктов через Elasticsearch."""
+        search = ProductQueryService.apply_common_filters(
+            Search(),
+            category_id=1,
+            min_price=Decimal('500.00'),
+            max_price=Decimal('1000.00'),
+            min_discount=Decimal('0.00'),
+            in_stock=True
+        )
+
+        filters = search.to_dict()['query']['bool']['filter']
+        self.assertIn({'terms': {'category.id': [1, 2]}}, filters)
+        self.assertIn(
+            {'range': {'price_with_discount': {'gte': Decimal('500.00'), 'lte': Decimal('1000.00')}}}, filters
+        )
+        self.assertIn({'range': {'discount': {'gte': Decimal('0.00')}}}, filters)
+        self.assertIn({'range': {'stock': {'gt': 0}}}, filters)
+        mock_descendants.assert_called_once_with(1)
@@ -75,30 +75,31 @@ class ProductModelTests(TestCase):
     Проверяет создание, валидацию и методы модели Product.
     """
 
-    def setUp(self):
-        """Подготовка данных для тестов."""
-        self.user = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        """Подготовка тестовых данных."""
+        cls.user = User.objects.create_user(
             username='testuser',
             email='test@example.com',
             password='testpass123'
         )
-        self.category = Category.objects.create(
+        cls.category = Category.objects.create(
             title='Электроника',
             description='Электронные устройства'
         )
-        self.image = SimpleUploadedFile(
+        image = SimpleUploadedFile(
             name='test_image.jpg',
             content=b'GIF87a\x01\x00\x01\x00\x80\x01\x00\x00\x00\x00ccc,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;',
             content_type='image/jpeg'
         )
-        self.product = Product.objects.create(
+        cls.product = Product.objects.create(
             title='iPhone 15',
             description='Новый iPhone',
             price=Decimal('999.99'),
             stock=10,
-            category=self.category,
-            user=self.user,
-            thumbnail=self.image
+            category=cls.category,
+            user=cls.user,
+            thumbnail=image
         )
 
     def test_product_creation(self):
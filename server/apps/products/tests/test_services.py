@@ -6,13 +6,21 @@
 
 from django.core.cache import cache
 from decimal import Decimal
+from unittest.mock import patch
 from django.test import TestCase, override_settings, RequestFactory
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.files.uploadedfile import SimpleUploadedFile
 from apps.products.models import Category, Product
+from apps.products.serializers import ProductListSerializer
 from apps.products.services.product_services import ProductServices
 from apps.products.services.query_services import ProductQueryService
+from apps.products.services.tasks import (
+    recompute_popularity_scores, schedule_popularity_update, update_popularity_scores_bulk
+)
+from apps.products.utils import calculate_popularity_score, get_request_params
 from apps.products.exceptions import ProductNotFound, ProductServiceException
+from apps.reviews.models import Review
 
 User = get_user_model()
 
@@ -55,6 +63,33 @@ class ProductServicesTests(TestCase):
             'thumbnail': self.image
         }
 
+    @patch('apps.products.services.tasks.bulk_reindex_products.delay')
+    @patch('apps.products.signals.schedule_elasticsearch_update')
+    def test_bulk_import_products(self, mock_schedule, mock_reindex):
+        """Тест пакетного импорта: без сигналов, с поисковыми векторами и одной задачей индексации."""
+        rows = [
+            {'title': f'Imported phone {i}', 'description': 'bulk', 'price': Decimal('10.00'),
+             'stock': 1, 'category': self.category}
+            for i in range(3)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            product_ids = ProductServices.bulk_import_products(rows, self.user)
+
+        self.assertEqual(Product.objects.filter(pk__in=product_ids, is_active=True).count(), 3)
+        mock_schedule.assert_not_called()
+        mock_reindex.assert_called_once_with(product_ids)
+
+        request = self.factory.get('/products', {'q': 'imported'})
+        results = ProductQueryService.search_products_db(Product.objects.all(), request)
+        self.assertCountEqual([p.pk for p in results], product_ids)
+
+    def test_bulk_import_products_invalid(self):
+        """Тест отклонения импорта с некорректными данными без частичного сохранения."""
+        rows = [{'title': 'Broken', 'price': Decimal('0.00'), 'category': self.category}]
+        with self.assertRaises(ProductServiceException):
+            ProductServices.bulk_import_products(rows, self.user)
+        self.assertFalse(Product.objects.filter(title='Broken').exists())
+
     def test_create_product(self):
         """Тест создания продукта через сервис."""
         product = ProductServices.create_product(self.valid_data, self.user)
@@ -181,6 +216,29 @@ class ProductServicesTests(TestCase):
         expected_price = Decimal('1099.99') * Decimal('0.90')
         self.assertEqual(updated_product.price_with_discount, expected_price)
 
+    def test_refresh_product_stats(self):
+        """Тест пересчета денормализованных рейтинга и счетчиков продукта."""
+        product = ProductServices.create_product(self.valid_data, self.user)
+        other_user = User.objects.create_user(
+            username='reviewer',
+            email='reviewer@example.com',
+            password='testpass123'
+        )
+        Review.objects.create(product=product, user=self.user, value=5, text='Отлично')
+        Review.objects.create(product=product, user=other_user, value=3, text='Нормально')
+
+        # Сигнал отзыва пересчитывает данные одним UPDATE
+        product.refresh_from_db()
+        self.assertEqual(product.rating_avg, 4.0)
+        self.assertEqual(product.review_count, 2)
+        self.assertEqual(product.purchase_count, 0)
+
+        Review.objects.filter(user=other_user).delete()
+        ProductServices.refresh_product_stats(product.id)
+        product.refresh_from_db()
+        self.assertEqual(product.rating_avg, 5.0)
+        self.assertEqual(product.review_count, 1)
+
     def test_delete_product_with_reviews(self):
         """Тест удаления продукта с отзывами."""
         product = ProductServices.create_product(self.valid_data, self.user)
@@ -274,11 +332,73 @@ class ProductQueryServiceTests(TestCase):
         products = ProductQueryService.get_product_list(request)
         self.assertEqual(products.count(), 3)
 
-        # Проверяем наличие аннотаций
+        # Рейтинг читается из денормализованного поля без агрегации
         product = products.first()
         self.assertTrue(hasattr(product, 'rating_avg'))
-        self.assertTrue(hasattr(product, 'purchase_count'))
-        self.assertTrue(hasattr(product, 'review_count'))
+
+        # Сериализация списка не требует дополнительных запросов к категориям
+        with self.assertNumQueries(0):
+            ProductListSerializer(product).data
+
+    @override_settings(TESTING=False)
+    def test_get_base_queryset_my_products(self):
+        """Тест выборки собственных продуктов пользователя."""
+        self.product3.is_active = False
+        self.product3.save()
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass')
+
+        request = self.factory.get('/products', {'my_products': 'true'})
+        request.user = self.user
+        self.assertEqual(ProductQueryService.get_base_queryset(request).count(), 3)
+
+        request.user = other
+        self.assertFalse(ProductQueryService.get_base_queryset(request).exists())
+
+        request = self.factory.get('/products', {'my_products': 'true'})
+        request.user = AnonymousUser()
+        self.assertFalse(ProductQueryService.get_base_queryset(request).exists())
+
+        request = self.factory.get('/products')
+        request.user = AnonymousUser()
+        self.assertEqual(ProductQueryService.get_base_queryset(request).count(), 2)
+
+    def test_recompute_popularity_scores(self):
+        """Тест массового пересчета популярности одним запросом."""
+        with self.assertNumQueries(1):
+            recompute_popularity_scores()
+        self.product1.refresh_from_db()
+        # Новый продукт: только составляющая новизны 0.1 / (0 + 1)
+        self.assertAlmostEqual(self.product1.popularity_score, 0.1)
+        self.assertAlmostEqual(self.product1.popularity_score, calculate_popularity_score(self.product1))
+
+    def test_update_popularity_scores_bulk(self):
+        """Тест пакетного обновления популярности с одной инвалидацией кэша."""
+        Product.objects.filter(pk__in=[self.product1.pk, self.product2.pk]).update(popularity_score=0)
+        cache.set(f"product_detail:{self.product1.pk}", {'id': self.product1.pk})
+        with self.assertNumQueries(1):
+            update_popularity_scores_bulk([self.product1.pk, self.product2.pk])
+
+        self.product1.refresh_from_db()
+        self.product2.refresh_from_db()
+        self.assertAlmostEqual(self.product1.popularity_score, 0.1)
+        self.assertAlmostEqual(self.product2.popularity_score, 0.1)
+        self.assertIsNone(cache.get(f"product_detail:{self.product1.pk}"))
+
+    def test_schedule_popularity_update_inline(self):
+        """Тест пересчета популярности в процессе после фиксации транзакции без брокера."""
+        Product.objects.filter(pk=self.product1.pk).update(popularity_score=0)
+        with self.settings(INLINE_POPULARITY=True), \
+                patch.object(update_popularity_scores_bulk, 'delay') as mock_delay:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                schedule_popularity_update([self.product1.pk])
+            self.product1.refresh_from_db()
+            self.assertEqual(self.product1.popularity_score, 0)
+
+            for callback in callbacks:
+                callback()
+        mock_delay.assert_not_called()
+        self.product1.refresh_from_db()
+        self.assertAlmostEqual(self.product1.popularity_score, 0.1)
 
     def test_get_single_product(self):
         """Тест получения одного продукта."""
@@ -286,6 +406,11 @@ class ProductQueryServiceTests(TestCase):
         product = ProductQueryService.get_single_product(self.product1.id, request)
         self.assertEqual(product.id, self.product1.id)
         self.assertTrue(hasattr(product, 'rating_avg'))
+        self.assertTrue(hasattr(product, 'purchase_count'))
+        self.assertTrue(hasattr(product, 'review_count'))
+        with self.assertNumQueries(0):
+            product.category.title
+            product.user.username
 
     def test_get_single_product_not_found(self):
         """Тест получения несуществующего продукта."""
@@ -293,6 +418,18 @@ class ProductQueryServiceTests(TestCase):
         with self.assertRaises(ProductNotFound):
             ProductQueryService.get_single_product(999, request)
 
+    def test_search_products_db(self):
+        """Тест полнотекстового поиска в PostgreSQL с ранжированием."""
+        request = self.factory.get('/products', {'q': 'iphone'})
+        results = list(ProductQueryService.search_products_db(Product.objects.all(), request))
+        self.assertEqual(results, [self.product1])
+        self.assertTrue(hasattr(results[0], 'rank'))
+
+        # Поисковый вектор строится со стеммингом конфигурации russian: словоформы совпадают
+        request = self.factory.get('/products', {'q': 'phones'})
+        results = list(ProductQueryService.search_products_db(Product.objects.all(), request))
+        self.assertEqual(results, [self.product2])
+
     def test_apply_common_filters(self):
         """Тест применения фильтров."""
         # Фильтр по категории
@@ -326,6 +463,29 @@ class ProductQueryServiceTests(TestCase):
         self.assertEqual(queryset.count(), 1)
         self.assertEqual(queryset.first(), self.product2)
 
+    def test_category_descendant_ids_cached(self):
+        """Тест кэширования ID потомков категории и его инвалидации."""
+        cache.clear()
+        descendant_ids = ProductQueryService.get_category_descendant_ids(self.electronics.id)
+        self.assertCountEqual(descendant_ids, [self.electronics.id, self.phones.id])
+
+        # Повторный вызов обслуживается из кэша без запросов к БД
+        with self.assertNumQueries(0):
+            self.assertCountEqual(
+                ProductQueryService.get_category_descendant_ids(self.electronics.id), descendant_ids
+            )
+
+        # Новая подкатегория сбрасывает кэш через сигнал
+        tablets = Category.objects.create(title='Планшеты', parent=self.electronics)
+        self.assertIn(tablets.id, ProductQueryService.get_category_descendant_ids(self.electronics.id))
+
+        # Перенос узла обновляет наборы и прежнего, и нового предка
+        ProductQueryService.get_category_descendant_ids(self.phones.id)
+        tablets.parent = self.phones
+        tablets.save()
+        self.assertIn(tablets.id, ProductQueryService.get_category_descendant_ids(self.phones.id))
+        self.assertIn(tablets.id, ProductQueryService.get_category_descendant_ids(self.electronics.id))
+
     def test_apply_ordering(self):
         """Тест применения сортировки."""
         class MockRequest:
@@ -351,6 +511,41 @@ class ProductQueryServiceTests(TestCase):
         queryset = ProductQueryService.apply_ordering(Product.objects.all(), request)
         self.assertTrue(queryset.ordered)  # Проверяем, что сортировка применена (по умолчанию)
 
+    def test_request_params_parsed_once(self):
+        """Тест однократного разбора GET-параметров за запрос."""
+        request = self.factory.get('/products', {
+            'category': '5', 'price__gte': '10', 'in_stock': 'True', 'ordering': '-price', 'q': ' iphone '
+        })
+        params = get_request_params(request)
+        self.assertIs(get_request_params(request), params)
+        self.assertEqual(params.filters(), {
+            'category_id': 5, 'min_price': 10.0, 'max_price': None, 'min_discount': None, 'in_stock': True
+        })
+        self.assertEqual((params.ordering, params.q), ('-price', 'iphone'))
+
+        with self.assertRaises(ProductServiceException):
+            get_request_params(self.factory.get('/products', {'min_price': 'abc'}))
+
+    def test_build_list_queryset(self):
+        """Тест единого построения QuerySet списка: результат совпадает с цепочкой вызовов."""
+        request = self.factory.get('/products', {
+            'category_id': self.electronics.id, 'min_price': '50', 'in_stock': 'true', 'ordering': 'price'
+        })
+        chained = ProductQueryService.apply_ordering(
+            ProductQueryService.get_product_list(
+                request, queryset=ProductQueryService.apply_filters(Product.objects.all(), request)
+            ),
+            request
+        )
+        built = ProductQueryService.build_list_queryset(Product.objects.all(), request)
+        self.assertEqual(list(built), list(chained))
+        self.assertEqual(list(built), [self.product2, self.product1])
+
+        # Без ordering применяется сортировка по популярности
+        request = self.factory.get('/products')
+        built = ProductQueryService.build_list_queryset(Product.objects.all(), request)
+        self.assertEqual(built.query.order_by, ('-popularity_score',))
+
     def test_pagination(self):
         """Тест пагинации продуктов."""
         # Создаем дополнительные продукты для тестирования пагинации
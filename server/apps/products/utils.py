@@ -1,8 +1,9 @@
 import logging
-from typing import Dict, Any
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional
 from django.http import HttpRequest
-from django.db.models import Avg
-from django.utils import timezone
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, ExtractDay, Now
 from functools import wraps
 from rest_framework.response import Response
 from rest_framework import status
@@ -13,6 +14,102 @@ from apps.products.exceptions import ProductServiceException, ProductNotFound, I
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True, slots=True)
+class FilterParams:
+    """Параметры списка продуктов, разобранные из GET-запроса один раз.
+
+    Attributes:
+        category_id: ID категории для фильтрации.
+        min_price: Минимальная цена.
+        max_price: Максимальная цена.
+        min_discount: Минимальная скидка (в процентах).
+        in_stock: Фильтр по наличию на складе.
+        ordering: Поле сортировки (без проверки допустимости).
+        q: Поисковый запрос без пробелов по краям.
+        my_products: Значение флага my_products.
+    """
+    category_id: Optional[int] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    min_discount: Optional[float] = None
+    in_stock: Optional[bool] = None
+    ordering: Optional[str] = None
+    q: str = ''
+    my_products: Optional[str] = None
+
+    @classmethod
+    def from_query(cls, params: Any) -> 'FilterParams':
+        """Разбирает параметры фильтрации, сортировки и поиска.
+
+        Args:
+            params: QueryDict (или словарь) с GET-параметрами.
+
+        Returns:
+            FilterParams: Разобранные параметры.
+
+        Raises:
+            ProductServiceException: Если параметры фильтрации некорректны.
+        """
+        try:
+            # Проверяем category_id или category
+            category_value = next(
+                (params.get(key) for key in ('category_id', 'category') if params.get(key) is not None), None
+            )
+            # Проверяем min_price или price__gte
+            min_price_value = next(
+                (params.get(key) for key in ('min_price', 'price__gte') if params.get(key) is not None), None
+            )
+            # Проверяем max_price или price__lte
+            max_price_value = next(
+                (params.get(key) for key in ('max_price', 'price__lte') if params.get(key) is not None), None
+            )
+            min_discount = params.get('min_discount')
+            in_stock = params.get('in_stock')
+            return cls(
+                category_id=int(category_value) if category_value is not None else None,
+                min_price=float(min_price_value) if min_price_value is not None else None,
+                max_price=float(max_price_value) if max_price_value is not None else None,
+                min_discount=float(min_discount) if min_discount is not None else None,
+                in_stock=in_stock.lower() == 'true' if in_stock is not None else None,
+                ordering=params.get('ordering'),
+                q=(params.get('q') or '').strip(),
+                my_products=params.get('my_products'),
+            )
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Invalid filter parameters: {str(e)}")
+            raise ProductServiceException(f"Некорректные параметры фильтрации: {str(e)}")
+
+    def filters(self) -> Dict[str, Any]:
+        """Возвращает только параметры фильтрации в виде словаря.
+
+        Returns:
+            Dict[str, Any]: category_id, min_price, max_price, min_discount и in_stock.
+        """
+        data = asdict(self)
+        for key in ('ordering', 'q', 'my_products'):
+            data.pop(key)
+        return data
+
+
+def get_request_params(request: HttpRequest) -> FilterParams:
+    """Возвращает параметры запроса, разбирая GET-параметры не более одного раза за запрос.
+
+    Args:
+        request: HTTP-запрос.
+
+    Returns:
+        FilterParams: Параметры, сохраненные в атрибуте запроса.
+
+    Raises:
+        ProductServiceException: Если параметры фильтрации некорректны.
+    """
+    params = getattr(request, '_filter_params', None)
+    if params is None:
+        params = FilterParams.from_query(request.GET)
+        request._filter_params = params
+    return params
+
+
 def get_filter_params(request: HttpRequest) -> Dict[str, Any]:
     """Извлекает параметры фильтрации из HTTP-запроса.
 
@@ -25,47 +122,39 @@ def get_filter_params(request: HttpRequest) -> Dict[str, Any]:
     Raises:
         ProductServiceException: Если параметры фильтрации некорректны.
     """
-    params = request.GET
-    result = {
-        'category_id': None,
-        'min_price': None,
-        'max_price': None,
-        'min_discount': None,
-        'in_stock': None,
-    }
-    try:
-        # Проверяем category_id или category
-        category_value = next((params.get(key) for key in ('category_id', 'category') if params.get(key) is not None),
-                              None)
-        if category_value is not None:
-            result['category_id'] = int(category_value)
-
-        # Проверяем min_price или price__gte
-        min_price_value = next((params.get(key) for key in ('min_price', 'price__gte') if params.get(key) is not None),
-                               None)
-        if min_price_value is not None:
-            result['min_price'] = float(min_price_value)
-
-        # Проверяем max_price или price__lte
-        max_price_value = next((params.get(key) for key in ('max_price', 'price__lte') if params.get(key) is not None),
-                               None)
-        if max_price_value is not None:
-            result['max_price'] = float(max_price_value)
-
-        # Проверяем min_discount
-        min_discount = params.get('min_discount')
-        if min_discount is not None:
-            result['min_discount'] = float(min_discount)
-
-        # Проверяем in_stock
-        in_stock = params.get('in_stock')
-        if in_stock is not None:
-            result['in_stock'] = in_stock.lower() == 'true'
-
-        return result
-    except (ValueError, TypeError) as e:
-        logger.warning(f"Invalid filter parameters: {str(e)}")
-        raise ProductServiceException(f"Некорректные параметры фильтрации: {str(e)}")
+    return get_request_params(request).filters()
+
+
+def popularity_score_expression() -> ExpressionWrapper:
+    """Строит SQL-выражение показателя популярности продукта.
+
+    Формула учитывает количество покупок (40%), отзывов (20%), средний рейтинг (30%) и новизну (10%).
+    Все составляющие вычисляются коррелированными подзапросами, поэтому выражение подходит
+    как для annotate(), так и для массового update().
+
+    Returns:
+        ExpressionWrapper: Выражение с output_field FloatField.
+    """
+    from apps.carts.models import OrderItem
+    from apps.reviews.models import Review
+
+    purchases = OrderItem.objects.filter(
+        product=OuterRef('pk'), order__status__in=['delivered', 'processing']
+    ).values('product')
+    reviews = Review.objects.filter(product=OuterRef('pk')).values('product')
+    purchase_count = Coalesce(Subquery(purchases.annotate(cnt=Count('id')).values('cnt')), 0)
+    review_count = Coalesce(Subquery(reviews.annotate(cnt=Count('id')).values('cnt')), 0)
+    rating_avg = Coalesce(Subquery(reviews.annotate(avg=Avg('value')).values('avg')), 0.0, output_field=FloatField())
+    days_since_created = ExtractDay(
+        ExpressionWrapper(Now() - F('created'), output_field=DurationField())
+    ) + 1
+    return ExpressionWrapper(
+        Cast(purchase_count, FloatField()) * Value(0.4) +
+        Cast(review_count, FloatField()) * Value(0.2) +
+        rating_avg * Value(0.3) +
+        Value(0.1) / Cast(days_since_created, FloatField()),
+        output_field=FloatField()
+    )
 
 
 def calculate_popularity_score(product) -> float:
@@ -77,17 +166,10 @@ def calculate_popularity_score(product) -> float:
     Returns:
         float: Показатель популярности, рассчитанный на основе покупок, отзывов, рейтинга и возраста продукта.
     """
-    purchase_count = product.order_items.filter(order__status__in=['delivered', 'processing']).count()
-    review_count = product.reviews.count()
-    rating_avg = product.reviews.aggregate(Avg('value'))['value__avg'] or 0.0
-    days_since_created = (timezone.now() - product.created).days + 1
-    # Формула популярности: учитывает количество покупок (40%), отзывов (20%), средний рейтинг (30%) и новизну (10%)
-    return (
-            (purchase_count * 0.4) +
-            (review_count * 0.2) +
-            (rating_avg * 0.3) +
-            (1 / days_since_created * 0.1)
-    )
+    # Все составляющие считаются одним запросом вместо отдельных COUNT/AVG
+    return type(product).objects.filter(pk=product.pk).annotate(
+        score=popularity_score_expression()
+    ).values_list('score', flat=True).get()
 
 
 def handle_api_errors(view_func):
@@ -1,4 +1,8 @@
+import hashlib
 import logging
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 from mptt.utils import get_cached_trees
 from rest_framework import status
 from rest_framework.views import APIView
@@ -26,14 +30,48 @@ from apps.core.services.cache_services import CacheService
 logger = logging.getLogger(__name__)
 
 
+class CachedCountPaginator(Paginator):
+    """Пагинатор, кэширующий общее количество продуктов для одинаковых запросов.
+
+    Ключ строится по хешу SQL запроса и версии кэша списка продуктов, поэтому все страницы
+    одной выборки используют один COUNT, а изменение продуктов делает старые значения недостижимыми.
+
+    Attributes:
+        COUNT_CACHE_TIMEOUT: Время жизни кэша количества в секундах (5 минут).
+    """
+    COUNT_CACHE_TIMEOUT = 60 * 5
+
+    @cached_property
+    def count(self) -> int:
+        """Возвращает общее количество объектов, используя кэш.
+
+        Returns:
+            int: Количество объектов в выборке.
+        """
+        try:
+            query_hash = hashlib.md5(str(self.object_list.query).encode()).hexdigest()
+        except EmptyResultSet:
+            # Заведомо пустая выборка (none(), id__in=[]) не компилируется в SQL
+            return 0
+        version = CacheService.get_cache_version('product_list')
+        cache_key = f"product_count:v{version}:{query_hash}"
+        count = CacheService.get_cached_data(cache_key)
+        if count is None:
+            count = super().count
+            CacheService.set_cached_data(cache_key, count, timeout=self.COUNT_CACHE_TIMEOUT)
+        return count
+
+
 class ProductPagination(PageNumberPagination):
     """Настройки пагинации для списков продуктов.
 
     Attributes:
+        django_paginator_class: Пагинатор с кэшированием общего количества продуктов.
         page_size: Количество продуктов на странице по умолчанию (20).
         max_page_size: Максимальное количество продуктов на странице (100).
         page_size_query_param: Параметр запроса для изменения размера страницы.
     """
+    django_paginator_class = CachedCountPaginator
     page_size = 20
     max_page_size = 100
     page_size_query_param = 'page_size'
@@ -65,10 +103,8 @@ class BaseProductView(APIView):
             ProductServiceException: Если обработка не удалась.
         """
         try:
-            # Применяем фильтры, аннотации и сортировку
-            queryset = ProductQueryService.apply_filters(queryset, request)
-            queryset = ProductQueryService.get_product_list(queryset=queryset, request=request)
-            queryset = ProductQueryService.apply_ordering(queryset, request)
+            # Применяем фильтры, выбор полей и сортировку за один проход
+            queryset = ProductQueryService.build_list_queryset(queryset, request)
 
             # Пагинация
             paginator = self.pagination_class()
@@ -84,6 +120,36 @@ class BaseProductView(APIView):
             logger.error(f"Failed to process queryset: {str(e)}, user={user_id}")
             raise ProductServiceException(f"Ошибка обработки списка продуктов: {str(e)}")
 
+    def process_keyset(self, queryset: Any, request: Any, cache_key: str, user_id: str) -> Response:
+        """Обрабатывает QuerySet с keyset-пагинацией по курсору вместо OFFSET.
+
+        Args:
+            queryset: QuerySet продуктов для обработки.
+            request: HTTP-запрос с параметром cursor и параметрами фильтрации.
+            cache_key: Ключ для кэширования ответа.
+            user_id: Идентификатор пользователя или 'anonymous'.
+
+        Returns:
+            Response: Страница продуктов и курсор следующей страницы.
+
+        Raises:
+            ValueError: Если курсор некорректен или задана сортировка, отличная от популярности.
+        """
+        if ProductQueryService.resolve_ordering(request) != ProductQueryService.KEYSET_ORDERING[0]:
+            raise ValueError("Курсорная пагинация поддерживает только сортировку по популярности")
+        after = ProductQueryService.parse_cursor(request.GET.get('cursor', ''))
+        page_size = self.pagination_class().get_page_size(request)
+
+        queryset = ProductQueryService.build_list_queryset(queryset, request)
+        page = list(ProductQueryService.apply_keyset(queryset, after, page_size))
+        response_data = {
+            'next': ProductQueryService.encode_cursor(page[-1]) if len(page) == page_size else None,
+            'results': ProductListSerializer(page, many=True).data,
+        }
+        CacheService.set_cached_data(cache_key, response_data, timeout=self.CACHE_TIMEOUT)
+        logger.info(f"Retrieved {len(page)} products by cursor, user={user_id}")
+        return Response(response_data)
+
 
 class CategoryListView(BaseProductView):
     """Представление для получения списка категорий."""
@@ -127,9 +193,11 @@ class ProductListView(BaseProductView):
 
         Если в запросе присутствует параметр 'q', выполняется поиск через Elasticsearch.
         В противном случае возвращается отфильтрованный список продуктов.
+        С параметром cursor (без q) список отдается keyset-пагинацией: пустой cursor — первая страница,
+        значение поля next ответа — курсор следующей.
 
         Args:
-            request: HTTP-запрос с параметрами q, category_id, min_price, max_price, min_discount, in_stock, page, page_size, ordering.
+            request: HTTP-запрос с параметрами q, category_id, min_price, max_price, min_discount, in_stock, page, page_size, ordering, cursor.
 
         Returns:
             Response: Ответ с пагинированным списком продуктов.
@@ -140,7 +208,8 @@ class ProductListView(BaseProductView):
         user_id = request.user.id if request.user.is_authenticated else 'anonymous'
         logger.info(f"Retrieving product list or search, user={user_id}, path={request.path}")
         try:
-            cached_data = CacheService.cache_product_list(request)
+            cache_key = CacheService.build_product_list_key(request)
+            cached_data = CacheService.cache_product_list(request, cache_key)
             if cached_data:
                 return Response(cached_data)
 
@@ -149,7 +218,8 @@ class ProductListView(BaseProductView):
                 queryset = ProductQueryService.search_products(request)
             else:
                 queryset = ProductQueryService.get_base_queryset(request)
-            cache_key = CacheService.build_cache_key(request, prefix="product_list")
+            if 'cursor' in request.GET and not request.GET.get('q'):
+                return self.process_keyset(queryset, request, cache_key, user_id)
             return self.process_queryset(queryset, request, cache_key, user_id)
         except ValueError as e:
             logger.warning(f"Invalid parameters: {str(e)}, user={user_id}")
@@ -189,6 +259,8 @@ class ProductDetailView(BaseProductView):
                 return Response(cached_data)
 
             product = ProductQueryService.get_single_product(pk, request)
+            # Вложенные подкатегории сериализуются из поддерева, загруженного одним запросом
+            product.category = ProductQueryService.build_category_tree(product.category)
             serializer = self.serializer_class(product, context={'request': request})
             cache_key = f'product_detail:{pk}'
             CacheService.set_cached_data(cache_key, serializer.data, timeout=7200)
@@ -224,9 +296,6 @@ class ProductCreateView(BaseProductView):
             serializer.is_valid(raise_exception=True)
             product = ProductServices.create_product(serializer.validated_data, request.user)
 
-            # Инвалидация кэша списка продуктов
-            CacheService.invalidate_cache(prefix="product_list")
-
             logger.info(f"Successfully created product {product.id}, user={user_id}")
             return Response(
                 ProductDetailSerializer(product).data,
@@ -270,7 +339,6 @@ class ProductUpdateView(BaseProductView):
             updated_product = ProductServices.update_product(pk, serializer.validated_data, request.user)
 
             CacheService.invalidate_cache(prefix="product_detail", pk=product.id)
-            CacheService.invalidate_cache(prefix="product_list")
             logger.info(f"Successfully updated product {pk}, user={user_id}")
             return Response(self.serializer_class(updated_product).data)
         except ProductNotFound as e:
@@ -308,7 +376,6 @@ class ProductDeleteView(BaseProductView):
 
             ProductServices.delete_product(pk, request.user)
             CacheService.invalidate_cache(prefix="product_detail", pk=product.id)
-            CacheService.invalidate_cache(prefix="product_list")
             logger.info(f"Successfully deleted product {pk}, user={user_id}")
             return Response({"message": "Продукт удален"}, status=status.HTTP_204_NO_CONTENT)
         except ProductNotFound as e:
@@ -337,7 +404,7 @@ class CategoryDetailView(APIView):
         user_id = request.user.id if request.user.is_authenticated else 'anonymous'
         logger.info(f"Retrieving category {pk}, user={user_id}, path={request.path}")
         try:
-            category = Category.objects.prefetch_related('children', 'products').get(pk=pk)
+            category = ProductQueryService.build_category_tree(Category.objects.get(pk=pk))
             serializer = CategorySerializer(category)
             logger.info(f"Successfully retrieved category {pk}, user={user_id}")
             return Response(serializer.data)
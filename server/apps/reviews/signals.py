@@ -10,7 +10,8 @@ from django.dispatch import receiver
 
 from apps.core.services.cache_services import CacheService
 from apps.reviews.models import Review
-from apps.products.services.tasks import update_elasticsearch_task, update_popularity_score
+from apps.products.services.product_services import ProductServices
+from apps.products.services.tasks import schedule_elasticsearch_update, schedule_popularity_update
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +20,7 @@ logger = logging.getLogger(__name__)
 def update_product_data(sender, instance, **kwargs):
     """Обновляет данные продукта после изменения отзыва.
 
+    Синхронно пересчитывает денормализованный рейтинг и количество отзывов продукта.
     Запускает асинхронные задачи для обновления:
     - Данных продукта в Elasticsearch
     - Показателя популярности продукта
@@ -41,7 +43,8 @@ def update_product_data(sender, instance, **kwargs):
     logger.info(f"Review {instance.id} {action} for product={product_id}, user={user_id}")
 
     CacheService.invalidate_cache(prefix=f"reviews:{instance.product_id}")
+    ProductServices.refresh_product_stats(product_id)
 
     # Обновляем данные в Elasticsearch и показатель популярности
-    update_elasticsearch_task.delay(product_id)
-    update_popularity_score.delay(product_id)
+    schedule_elasticsearch_update(product_id)
+    schedule_popularity_update([product_id])
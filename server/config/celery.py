@@ -64,4 +64,12 @@ app.conf.beat_schedule = {
         'task': 'apps.users.tasks.cleanup_expired_tokens',
         'schedule': crontab(hour=3, minute=0),  # Каждый день в 3:00
     },
+    'recompute-popularity-scores': {
+        'task': 'apps.products.services.tasks.recompute_popularity_scores',
+        'schedule': crontab(hour=4, minute=0),  # Каждый день в 4:00
+    },
+    'bulk-reindex-products': {
+        'task': 'apps.products.services.tasks.bulk_reindex_products',
+        'schedule': crontab(hour=4, minute=30),  # Каждый день в 4:30, после пересчета популярности
+    },
 }
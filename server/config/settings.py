@@ -148,6 +148,21 @@ if 'test' in sys.argv:
             'hosts': None
         }
     }
+    # Тестовая БД создается по текущему состоянию моделей, без прогона истории миграций.
+    # Для проверки самих миграций (например, в CI) задайте TEST_RUN_MIGRATIONS=true
+    if os.environ.get('TEST_RUN_MIGRATIONS', 'False').lower() not in ('true', '1', 't'):
+        class DisableMigrations:
+            """Сопоставляет каждому приложению отсутствие модуля миграций."""
+
+            def __contains__(self, item):
+                return True
+
+            def __getitem__(self, item):
+                return None
+
+        MIGRATION_MODULES = DisableMigrations()
+    # Быстрый хешер паролей: стойкость PBKDF2 в тестах не нужна, а create_user с ним занимает ~100 мс
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
     # Отключаем Debug Toolbar для тестов
     INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'debug_toolbar']
     MIDDLEWARE = [m for m in MIDDLEWARE if m != 'debug_toolbar.middleware.DebugToolbarMiddleware']
@@ -307,6 +322,15 @@ CACHES = {
             'MAX_CONNECTIONS': 50,
             'HEALTH_CHECK_INTERVAL': 30,
         }
+    },
+    # Кэш в памяти процесса для самых частых публичных ответов (перед Redis)
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'marketplace-local',
+        'TIMEOUT': 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 256,
+        }
     }
 }
 
@@ -330,6 +354,8 @@ CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
 CELERY_WORKER_SEND_TASK_EVENTS = True
+# Пересчет популярности выполняется в процессе после фиксации транзакции, минуя брокер
+INLINE_POPULARITY = os.environ.get('INLINE_POPULARITY', 'False').lower() in ('true', '1', 't')
 
 # Настройки Elasticsearch
 ELASTICSEARCH_DSL = {
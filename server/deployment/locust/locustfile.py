@@ -1,3 +1,4 @@
+import logging
 import random
 from locust import HttpUser, task, between, events
 import os
@@ -23,10 +24,34 @@ from apps.products.models import Product, Category
 from apps.reviews.models import Review
 from django.contrib.auth import get_user_model
 
+logger = logging.getLogger(__name__)
+
 User = get_user_model()
 PRODUCT_IDS = list(Product.objects.filter(is_active=True).values_list('id', flat=True))
 CATEGORY_IDS = list(Category.objects.all().values_list('id', flat=True))
 REVIEW_IDS = list(Review.objects.all().values_list('id', flat=True))
+SEARCH_QUERIES = ['iphone', 'samsung', 'телефон', 'ноутбук', 'наушники']
+
+# Бюджет p95 (мс) для ключевых эндпоинтов каталога. Если задан, прогон завершается
+# с кодом 1 при превышении - так регрессии производительности ловятся в CI
+P95_BUDGET_MS = os.environ.get('LOCUST_P95_BUDGET_MS')
+BUDGET_ENDPOINTS = ['/products/list', '/products/list?q', '/products/categories/[id]']
+
+
+@events.quitting.add_listener
+def check_latency_budget(environment, **kwargs):
+    """Проверяет p95 ключевых эндпоинтов по окончании прогона."""
+    if not P95_BUDGET_MS:
+        return
+    budget = int(P95_BUDGET_MS)
+    for name in BUDGET_ENDPOINTS:
+        entry = environment.stats.get(name, 'GET')
+        if not entry.num_requests:
+            continue
+        p95 = entry.get_response_time_percentile(0.95)
+        if p95 > budget:
+            logger.error(f"p95 budget exceeded for {name}: {p95}ms > {budget}ms")
+            environment.process_exit_code = 1
 
 
 class GuestUser(HttpUser):
@@ -56,6 +81,10 @@ class GuestUser(HttpUser):
             # Также смотрим отзывы к этому товару
             self.client.get(f"/reviews/{product_id}/", name="/reviews/[product_id]")
 
+    @task(2)
+    def search_products(self):
+        self.client.get("/products/list/", params={"q": random.choice(SEARCH_QUERIES)}, name="/products/list?q")
+
     @task(1)
     def view_categories(self):
         self.client.get("/products/categories/")